@@ -29,7 +29,10 @@ import sys
 # imports and circular imports... Just avoid it:
 sys.path.insert(0, __path__[0])
 
-from .api import Script, NotFoundError, set_debug_function
+from .api import Script, NotFoundError, Deadline, set_debug_function, \
+    set_profiling_collector, Collector, pin_module, unpin_module, \
+    get_cache_info, index_project, batch
+from .async_api import AsyncEvaluator
 from . import settings
 
 from . import api
@@ -77,12 +77,30 @@ else:
     eval(compile("""def exec_function(source, global_map):
                         exec source in global_map """, 'blub', 'exec'))
 
+# cPickle doesn't exist in Python 3, pickle is using the C version there.
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# Queue has been renamed to queue in Python 3.
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
 # StringIO (Python 2.5 has no io module), so use io only for py3k
 try:
     from StringIO import StringIO
 except ImportError:
     from io import StringIO
 
+# BytesIO for binary data like pickles
+try:
+    from cStringIO import StringIO as BytesIO
+except ImportError:
+    from io import BytesIO
+
 # hasattr function used because python
 if is_py3k:
     hasattr = hasattr
@@ -172,3 +190,12 @@ try:
     from functools import reduce
 except ImportError:
     reduce = reduce
+
+# functools.wraps fails for callables without a __name__ (e.g. decorator
+# objects) before Python 3.2
+import functools
+
+
+def wraps(func):
+    assigned = [a for a in functools.WRAPPER_ASSIGNMENTS if hasattr(func, a)]
+    return functools.wraps(func, assigned)
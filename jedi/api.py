@@ -4,12 +4,29 @@ use its methods.
 
 Additionally you can add a debug function with :func:`set_debug_function` and
 catch :exc:`NotFoundError` which is being raised if your completion is not
-possible.
+possible. A :class:`Deadline` limits the time of an operation. :func:`batch`
+runs many operations on one buffer with one parse.
+:func:`set_profiling_collector` shows where the time is spent.
+
+Parsed modules are cached within the limit of
+:data:`settings.module_cache_memory`. Open buffers should be pinned with
+:func:`pin_module`, :func:`get_cache_info` shows how well the cache works.
+
+Scripts may be used in several threads at the same time (e.g. a server with a
+thread pool), but a single :class:`Script` only in one thread. The parsed
+modules and the memoized results are shared, Scripts of the same buffer (path)
+wait for each other. Pass absolute paths, because the working directory may be
+changed for a moment to evaluate `sys.path` modifications.
 """
 from __future__ import with_statement
-__all__ = ['Script', 'NotFoundError', 'set_debug_function']
+__all__ = ['Script', 'NotFoundError', 'Deadline', 'set_debug_function',
+           'set_profiling_collector', 'Collector', 'pin_module',
+           'unpin_module', 'get_cache_info', 'index_project', 'batch']
 
 import re
+import os
+import sys
+import contextlib
 
 import parsing
 import dynamic
@@ -22,10 +39,13 @@ import keywords
 import helpers
 import common
 import builtin
+import fast_parser
 import api_classes
 import cache
 
 from _compatibility import next, unicode
+from common import Deadline
+from debug import Collector
 
 
 class NotFoundError(Exception):
@@ -67,14 +87,50 @@ class Script(object):
         """ lazy parser."""
         return self._module.parser
 
-    def complete(self):
+    @contextlib.contextmanager
+    def _request(self, deadline=None):
+        """
+        Runs an operation as a request (see `common.RequestState`), which ends
+        with the operation. Scripts of the same buffer wait for each other.
+        """
+        with modules.buffer_lock(self.source_path):
+            if not common.request.active:
+                api_classes._new_request()
+            try:
+                with common.deadline_scope(deadline):
+                    yield
+            finally:
+                api_classes._end_request()
+
+    def _set_position(self, line, column):
+        """ Moves the cursor within the same source, see :func:`batch`. """
+        self.pos = line, column
+        module = self._module
+        module.position = self.pos
+        module._part_parser = None
+        if isinstance(module._parser, fast_parser.FastParser):
+            module._parser.set_user_position(self.pos)
+        else:
+            # parse again with the new position
+            module._parser = None
+
+    def complete(self, deadline=None):
         """
         Return :class:`api_classes.Completion` objects. Those objects contain
         information about the completions, more than just names.
 
+        :param deadline: Stops the evaluation early and returns partial
+            results, if it expires.
+        :type deadline: :class:`Deadline`
+
         :return: Completion objects, sorted by name and __ comes last.
         :rtype: list of :class:`api_classes.Completion`
         """
+        with self._request(deadline):
+            return self._complete()
+
+    @debug.profiled('complete')
+    def _complete(self):
         def follow_imports_if_possible(name):
             # TODO remove this, or move to another place (not used)
             par = name.parent
@@ -121,7 +177,8 @@ class Script(object):
                         a = s.import_stmt.alias
                         if a and a.start_pos <= self.pos <= a.end_pos:
                             continue
-                        names = s.get_defined_names(on_import_stmt=True)
+                        names = s.get_defined_names(on_import_stmt=True,
+                                                    like=like)
                     else:
                         names = s.get_defined_names()
 
@@ -200,7 +257,7 @@ class Script(object):
         stmt.parent = self._parser.user_scope
         return stmt
 
-    def get_definition(self):
+    def get_definition(self, deadline=None):
         """
         Return the definitions of a the path under the cursor. This is not a
         goto function! This follows complicated paths and returns the end, not
@@ -210,8 +267,17 @@ class Script(object):
         a dynamic language, which means depending on an option you can have two
         different versions of a function.
 
+        :param deadline: Stops the evaluation early and returns partial
+            results, if it expires.
+        :type deadline: :class:`Deadline`
+
         :rtype: list of :class:`api_classes.Definition`
         """
+        with self._request(deadline):
+            return self._get_definition()
+
+    @debug.profiled('get_definition')
+    def _get_definition(self):
         def resolve_import_paths(scopes):
             for s in scopes.copy():
                 if isinstance(s, imports.ImportPath):
@@ -239,18 +305,24 @@ class Script(object):
                     if not isinstance(s, imports.ImportPath._GlobalNamespace)])
         return sorted(d, key=lambda x: (x.module_path, x.start_pos))
 
-    def goto(self):
+    def goto(self, deadline=None):
         """
         Return the first definition found by goto. Imports and statements
         aren't followed.  Multiple objects may be returned, because Python
         itself is a dynamic language, which means depending on an option you
         can have two different versions of a function.
 
+        :param deadline: Stops the evaluation early and returns partial
+            results, if it expires.
+        :type deadline: :class:`Deadline`
+
         :rtype: list of :class:`api_classes.Definition`
         """
-        d = [api_classes.Definition(d) for d in set(self._goto()[0])]
-        return sorted(d, key=lambda x: (x.module_path, x.start_pos))
+        with self._request(deadline):
+            d = [api_classes.Definition(d) for d in set(self._goto()[0])]
+            return sorted(d, key=lambda x: (x.module_path, x.start_pos))
 
+    @debug.profiled('goto')
     def _goto(self, add_import_name=False):
         """
         Used for goto and related_names.
@@ -301,7 +373,7 @@ class Script(object):
                     definitions = [user_stmt]
         return definitions, search_name
 
-    def related_names(self, additional_module_paths=[]):
+    def related_names(self, additional_module_paths=[], deadline=None):
         """
         Return :class:`api_classes.RelatedName` objects, which contain all
         names that point to the definition of the name under the cursor. This
@@ -310,8 +382,17 @@ class Script(object):
 
         .. todo:: Implement additional_module_paths
 
+        :param deadline: Stops the evaluation early and returns partial
+            results, if it expires.
+        :type deadline: :class:`Deadline`
+
         :rtype: list of :class:`api_classes.RelatedName`
         """
+        with self._request(deadline):
+            return self._related_names(additional_module_paths)
+
+    @debug.profiled('related_names')
+    def _related_names(self, additional_module_paths=[]):
         user_stmt = self._parser.user_stmt
         definitions, search_name = self._goto(add_import_name=True)
         if isinstance(user_stmt, parsing.Statement) \
@@ -337,6 +418,51 @@ class Script(object):
         return sorted(set(names), key=lambda x: (x.module_path, x.start_pos),
                                                                 reverse=True)
 
+    def index_names(self, deadline=None):
+        """
+        Generates the definitions of all names in the module (like
+        :meth:`goto`), e.g. for a code browser. The results are generated
+        statement by statement, so the first ones are available quickly.
+        Results, that are used by several names (e.g. the definitions of
+        imported modules) are evaluated only once. The position of the
+        Script doesn't matter. The names of a statement, whose evaluation
+        fails, have no definitions.
+
+        :param deadline: Stops generating, if it expires.
+        :type deadline: :class:`Deadline`
+
+        :return: Tuples of the name and its definitions, sorted by position.
+        :rtype: generator of (:class:`api_classes.RelatedName`, list of
+            :class:`api_classes.Definition`)
+        """
+        stmts = set()
+        with modules.buffer_lock(self.source_path):
+            for s in self._parser.module.used_names.values():
+                stmts |= s
+        for stmt in sorted(stmts, key=lambda s: s.start_pos):
+            if deadline is not None and deadline.expired():
+                break
+            with self._request(deadline):
+                names = self._index_statement(stmt)
+            for name in names:
+                yield name
+
+    @debug.profiled('index_names')
+    def _index_statement(self, stmt):
+        try:
+            names = dynamic.goto_names(stmt)
+        except Exception:
+            # A bug of the evaluation shouldn't stop the whole index.
+            debug.warning('index_names: %s failed: %r'
+                          % (stmt, sys.exc_info()[1]))
+            names = dynamic.goto_names(stmt, follow=False)
+        result = []
+        for name_part, definitions in names:
+            d = [api_classes.Definition(d) for d in set(definitions)]
+            d = sorted(d, key=lambda x: (x.module_path, x.start_pos))
+            result.append((api_classes.RelatedName(name_part, stmt), d))
+        return result
+
     def get_in_function_call(self):
         """
         Return the function object of the call you're currently in.
@@ -353,6 +479,11 @@ class Script(object):
 
         :rtype: :class:`api_classes.CallDef`
         """
+        with self._request():
+            return self._get_in_function_call()
+
+    @debug.profiled('get_in_function_call')
+    def _get_in_function_call(self):
         def check_user_stmt(user_stmt):
             if user_stmt is None \
                         or not isinstance(user_stmt, parsing.Statement):
@@ -450,8 +581,51 @@ class Script(object):
         match = re.match(r'^(.*?)(\.|)(\w?[\w\d]*)$', path, flags=re.S)
         return match.groups()
 
-    def __del__(self):
-        api_classes._clear_caches()
+
+def batch(source, requests, source_path, source_encoding='utf-8',
+          deadline=None):
+    """
+    Runs many operations on one buffer, e.g. to show the definitions of all
+    names in a file. The source is parsed once and the evaluated results are
+    shared, which is much faster than a :class:`Script` for every position.
+
+    >>> batch('import os\nos.path', [('goto', 2, 1),
+    ...                               ('get_definition', 2, 4)], '')
+
+    :param requests: Tuples ``(method, line, column)``, where the method is
+        ``'complete'``, ``'get_definition'`` or ``'goto'`` (see
+        :class:`Script`).
+    :param deadline: The deadline for all requests together.
+    :type deadline: :class:`Deadline`
+    :return: The results of the requests in the same order. A request, that
+        raises a :exc:`NotFoundError` or fails in the evaluation, returns an
+        empty list, the other requests are still done.
+    """
+    requests = list(requests)
+    for method, line, column in requests:
+        if method not in ('complete', 'get_definition', 'goto'):
+            raise ValueError('unknown method %s' % method)
+
+    script = None
+    results = []
+    # the parser is shared by all the requests
+    with modules.buffer_lock(source_path):
+        for method, line, column in requests:
+            if script is None:
+                script = Script(source, line, column, source_path,
+                                source_encoding)
+            else:
+                debug.reset_time()
+                script._set_position(line, column)
+            try:
+                results.append(getattr(script, method)(deadline=deadline))
+            except NotFoundError:
+                results.append([])
+            except Exception:
+                debug.warning('batch: %s at %s failed: %r'
+                              % (method, (line, column), sys.exc_info()[1]))
+                results.append([])
+    return results
 
 
 def set_debug_function(func_cb=debug.print_to_stdout, warnings=True,
@@ -465,3 +639,52 @@ def set_debug_function(func_cb=debug.print_to_stdout, warnings=True,
     debug.enable_warning = warnings
     debug.enable_notice = notices
     debug.enable_speed = speed
+
+
+def set_profiling_collector(collector=None):
+    """
+    Profile |jedi|: The :class:`Collector` receives the spans (e.g. ``parse``,
+    ``import``, ``follow_statement``, ``search_params``, ``introspection``
+    and the API calls like ``complete``) and counters. ``None`` disables the
+    profiling.
+
+    >>> collector = Collector()
+    >>> set_profiling_collector(collector)
+    >>> completions = Script('import json; json.l', 1, 19, '').complete()
+    >>> collector.write_chrome_trace('trace.json')
+    """
+    debug.collector = collector
+
+
+def pin_module(path):
+    """
+    Never remove the parsed module of `path` from the cache, e.g. because the
+    file is open in the editor.
+    """
+    builtin.CachedModule.cache.pin(os.path.abspath(path))
+
+
+def unpin_module(path):
+    """ The opposite of :func:`pin_module`, e.g. if the file is closed. """
+    builtin.CachedModule.cache.unpin(os.path.abspath(path))
+
+
+def get_cache_info():
+    """
+    Returns information about the cache of parsed modules as a dict:
+    ``modules`` (the number of modules), ``size`` (the estimated memory in
+    bytes), ``limit`` (in bytes or None), ``hits``, ``misses`` and
+    ``evictions``.
+    """
+    return builtin.CachedModule.cache.info()
+
+
+def index_project(root, workers=None):
+    """
+    Parses all Python files below `root` in parallel (with `workers`
+    processes, default: the number of CPUs), so that dynamic searches (e.g.
+    :meth:`Script.related_names`) don't have to read them again. Returns a
+    dict ``path -> summary`` of the defined names, imports, used names and
+    scopes. See :func:`dynamic.index_project`.
+    """
+    return dynamic.index_project(root, workers)
@@ -10,10 +10,10 @@ import warnings
 
 from _compatibility import unicode
 import cache
-import dynamic
-import helpers
+import common
 import settings
 import evaluate
+import builtin
 import imports
 import parsing
 import keywords
@@ -21,18 +21,30 @@ import keywords
 
 def _clear_caches():
     """
-    Clear all caches of this and related modules. The only cache that will not
-    be deleted is the module cache.
+    Clear all caches of this and related modules. The module cache and the
+    memoized results of modules, that didn't change, are not deleted.
     """
+    builtin.CachedModule.check_modified()
+    # ends the request of this thread, see `common.RequestState`
     cache.clear_caches()
-    dynamic.search_param_cache.clear()
-    helpers.ExecutionRecursionDecorator.reset()
 
-    evaluate.follow_statement.reset()
+    imports.imports_processed = 0
+
 
+def _new_request():
+    """
+    Starts a new request in this thread, see `common.RequestState`. The
+    operations of `api.Script` are requests.
+    """
+    cache.new_request()
     imports.imports_processed = 0
 
 
+def _end_request():
+    """ Ends the request of this thread, see `common.RequestState`. """
+    cache.end_request()
+
+
 class BaseDefinition(object):
     _mapping = {'posixpath': 'os.path',
                'riscospath': 'os.path',
@@ -0,0 +1,105 @@
+"""
+Awaitable variants of the :class:`api.Script` methods for asyncio (Python
+3.4+), e.g. for a web server. The evaluation runs in an executor (threads,
+see :mod:`api` about threads), not in the event loop::
+
+    evaluator = AsyncEvaluator()
+    completions = await evaluator.complete(source, line, column, path)
+
+A request for a buffer (the path) cancels the running request for the same
+buffer, e.g. after a new keystroke. The cancelled evaluation stops early (see
+:class:`api.Deadline`). Equal requests, that are running at the same time,
+share one evaluation.
+"""
+from __future__ import with_statement
+
+try:
+    import asyncio
+except ImportError:
+    # Python < 3.4
+    asyncio = None
+
+import api
+import common
+
+
+def _evaluate(key, deadline):
+    """ Evaluates a request in the executor (doesn't need asyncio). """
+    method, source, line, column, source_path, args = key
+    script = api.Script(source, line, column, source_path)
+    with common.deadline_scope(deadline):
+        if method == 'get_in_function_call':
+            return script.get_in_function_call()
+        return getattr(script, method)(*args, deadline=deadline)
+
+
+class AsyncEvaluator(object):
+    """
+    Runs the requests in `executor` (default: the default executor of the
+    loop). The methods take the parameters of :class:`api.Script` and return
+    awaitable futures of the results.
+    """
+    def __init__(self, executor=None, loop=None):
+        if asyncio is None:
+            raise ImportError('asyncio is not available')
+        self.executor = executor
+        self.loop = loop
+        self._running = {}
+        self._buffers = {}
+
+    def complete(self, source, line, column, source_path):
+        return self._request('complete', source, line, column, source_path)
+
+    def goto(self, source, line, column, source_path):
+        return self._request('goto', source, line, column, source_path)
+
+    def get_definition(self, source, line, column, source_path):
+        return self._request('get_definition', source, line, column,
+                             source_path)
+
+    def get_in_function_call(self, source, line, column, source_path):
+        return self._request('get_in_function_call', source, line, column,
+                             source_path)
+
+    def related_names(self, source, line, column, source_path,
+                      additional_module_paths=()):
+        return self._request('related_names', source, line, column,
+                             source_path, tuple(additional_module_paths))
+
+    def cancel(self, source_path):
+        """ Cancels the running request for the buffer `source_path`. """
+        try:
+            future, deadline, key = self._buffers.pop(source_path)
+        except KeyError:
+            return
+        if self._running.get(key) is future:
+            del self._running[key]
+        deadline.cancel()
+        future.cancel()
+
+    def _request(self, method, source, line, column, source_path, args=()):
+        key = method, source, line, column, source_path, args
+        future = self._running.get(key)
+        # The done callbacks run later, finished futures may still be there.
+        if future is None or future.done():
+            self.cancel(source_path)
+            future = self._submit(key)
+        # Cancelling the task of one caller doesn't cancel the evaluation for
+        # the others.
+        return asyncio.shield(future)
+
+    def _submit(self, key):
+        source_path = key[4]
+        deadline = common.Deadline()
+        loop = self.loop or asyncio.get_event_loop()
+        future = loop.run_in_executor(self.executor, _evaluate, key, deadline)
+        self._running[key] = future
+        self._buffers[source_path] = future, deadline, key
+
+        def done(f):
+            if self._running.get(key) is f:
+                del self._running[key]
+            if self._buffers.get(source_path, (None,))[0] is f:
+                del self._buffers[source_path]
+        future.add_done_callback(done)
+        return future
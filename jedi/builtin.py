@@ -1,9 +1,13 @@
 from __future__ import with_statement
-from _compatibility import exec_function, is_py3k
+from _compatibility import exec_function, is_py3k, literal_eval, queue
 
 import re
 import sys
 import os
+import atexit
+import signal
+import subprocess
+import threading
 if is_py3k:
     import io
 import types
@@ -15,6 +19,7 @@ import debug
 import parsing
 import fast_parser
 import evaluate
+import settings
 
 
 def get_sys_path():
@@ -33,12 +38,23 @@ def get_sys_path():
     return p
 
 
+def _module_evicted(path, parser):
+    """ Removes everything, that belongs to a module removed from the cache.
+    """
+    fast_parser.parser_cache.pop(path, None)
+    cache.invalidate_star_import_cache(parser.module)
+    cache.module_changed(path)
+
+
 class CachedModule(object):
     """
     The base type for all modules, which is not to be confused with
     `parsing.Module`. Caching happens here.
     """
-    cache = {}
+    cache = cache.ModuleCache(_module_evicted)
+    # Modules are parsed by one thread at a time, the fast parser reuses the
+    # parsers of the cached modules.
+    lock = threading.RLock()
 
     def __init__(self, path=None, name=None):
         self.path = path and os.path.abspath(path)
@@ -49,27 +65,69 @@ class CachedModule(object):
     def parser(self):
         """ get the parser lazy """
         if not self._parser:
+            with self.lock:
+                try:
+                    timestamp, parser = self.cache[self.path or self.name]
+                    if not self.path \
+                            or os.path.getmtime(self.path) <= timestamp:
+                        self._parser = parser
+                    else:
+                        # In case there is already a module cached and this
+                        # module has to be reparsed, we also need to
+                        # invalidate the import caches.
+                        cache.invalidate_star_import_cache(parser.module)
+                        raise KeyError()
+                except KeyError:
+                    self._load_module()
+        return self._parser
+
+    @classmethod
+    def check_modified(cls):
+        """
+        Removes the modules, that have been modified since they were parsed,
+        from the cache and invalidates the results that depend on them.
+        """
+        for key, (timestamp, parser) in list(cls.cache.items()):
+            if timestamp is None:
+                continue
             try:
-                timestamp, parser = self.cache[self.path or self.name]
-                if not self.path or os.path.getmtime(self.path) <= timestamp:
-                    self._parser = parser
-                else:
-                    # In case there is already a module cached and this module
-                    # has to be reparsed, we also need to invalidate the import
-                    # caches.
-                    cache.invalidate_star_import_cache(parser.module)
-                    raise KeyError()
+                if os.path.getmtime(key) <= timestamp:
+                    continue
+            except OSError:
+                # e.g. unsaved buffers
+                continue
+            try:
+                del cls.cache[key]
             except KeyError:
-                self._load_module()
-        return self._parser
+                # removed by another thread
+                continue
+            cache.invalidate_star_import_cache(parser.module)
+            cache.module_changed(key)
 
     def _get_source(self):
         raise NotImplementedError()
 
+    def _load_prebuilt(self):
+        """ Returns the parser from `cache.stub_index` or None. """
+        return None
+
     def _load_module(self):
-        source = self._get_source()
         p = self.path or self.name
-        self._parser = fast_parser.FastParser(source, p)
+        self._parser = self._load_prebuilt()
+        if self._parser is None:
+            source = self._get_source()
+            if self.path:
+                self._parser = cache.module_pickling.load_module(self.path,
+                                                                 source)
+            if self._parser is None:
+                self._parser = fast_parser.FastParser(source, p,
+                                    skeleton=settings.lazy_function_bodies)
+                if self.path:
+                    cache.module_pickling.save_module(self.path, source,
+                                                      self._parser)
+        if isinstance(self._parser, fast_parser.FastParser):
+            fast_parser.parser_cache[p] = self._parser
+        cache.module_changed(p)
         p_time = None if not self.path else os.path.getmtime(self.path)
 
         if self.path or self.name:
@@ -160,7 +218,52 @@ class Parser(CachedModule):
 
     def _get_source(self):
         """ Override this abstract method """
-        return _generate_code(self.module, self._load_mixins())
+        key = self._get_source_key()
+        source = cache.module_pickling.load_generated_source(key)
+        if source is None:
+            with debug.span('introspection', self.name):
+                if settings.introspection_in_subprocess:
+                    try:
+                        source = introspection_pool.generate_code(self, key)
+                    except IntrospectionTimeout:
+                        debug.warning('introspection timeout', self.name)
+                        return ''
+                if source is None:
+                    source = _generate_code(self.module,
+                                            self._load_mixins())
+            cache.module_pickling.save_generated_source(key, source)
+        return source
+
+    def _load_prebuilt(self):
+        return cache.stub_index.load_builtin(self._get_source_key())
+
+    def _get_source_key(self):
+        """
+        The generated source only changes, if the module, its mixins or the
+        interpreter change. Modules without a path are compiled into the
+        interpreter.
+        """
+        def mtime(path):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return None
+
+        if self.path:
+            module = self.path, mtime(self.path)
+        else:
+            module = self.name, sys.executable, sys.version
+        return 'builtin', module, mtime(self._get_mixin_path())
+
+    def _get_mixin_path(self):
+        name = self.name
+        # sometimes there are stupid endings like `_sqlite3.cpython-32mu`
+        name = re.sub(r'\..*', '', name)
+
+        if name == '__builtin__' and not is_py3k:
+            name = 'builtins'
+        path = os.path.dirname(os.path.abspath(__file__))
+        return os.path.sep.join([path, 'mixin', name]) + '.pym'
 
     def _load_mixins(self):
         """
@@ -199,14 +302,7 @@ class Parser(CachedModule):
             return funcs
 
         try:
-            name = self.name
-            # sometimes there are stupid endings like `_sqlite3.cpython-32mu`
-            name = re.sub(r'\..*', '', name)
-
-            if name == '__builtin__' and not is_py3k:
-                name = 'builtins'
-            path = os.path.dirname(os.path.abspath(__file__))
-            with open(os.path.sep.join([path, 'mixin', name]) + '.pym') as f:
+            with open(self._get_mixin_path()) as f:
                 s = f.read()
         except IOError:
             return {}
@@ -218,6 +314,156 @@ class Parser(CachedModule):
             return mixin_dct
 
 
+class IntrospectionTimeout(Exception):
+    pass
+
+
+class _IntrospectionWorker(object):
+    """
+    A process, that imports compiled modules and generates their source. It
+    runs this file as a script, see `_introspection_worker_main`.
+    """
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            universal_newlines=True)
+        self._lines = queue.Queue()
+        self._reader = threading.Thread(target=self._read)
+        self._reader.setDaemon(True)
+        self._reader.start()
+
+    def _read(self):
+        try:
+            for line in iter(self.process.stdout.readline, ''):
+                self._lines.put(line)
+            self._lines.put(None)
+        except Exception:
+            # The interpreter is shutting down, while the worker still runs
+            # (the modules of this thread are gone already).
+            pass
+
+    def generate_code(self, path, name, sys_path, timeout):
+        """ Returns the source or None, if the module couldn't be imported.
+        """
+        self.process.stdin.write(repr((path, name, sys_path)) + '\n')
+        self.process.stdin.flush()
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            raise IntrospectionTimeout()
+        if line is None:
+            raise EOFError('introspection worker died')
+        return literal_eval(line)
+
+    def kill(self):
+        """ Kills the process and waits for the reader thread to end. """
+        try:
+            # `Popen.kill` doesn't exist in Python 2.5
+            os.kill(self.process.pid, getattr(signal, 'SIGKILL',
+                                              signal.SIGTERM))
+        except OSError:
+            pass
+        self.process.wait()
+        self._reader.join()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+
+class IntrospectionPool(object):
+    """
+    Manages the introspection worker processes. Generated sources are cached
+    for the lifetime of the pool.
+    """
+    def __init__(self):
+        self._idle = []
+        self._count = 0
+        self._condition = threading.Condition()
+        self._results = {}
+
+    def generate_code(self, parser, key):
+        """
+        Returns the generated source of `parser` or None, if the worker
+        failed (the module is then imported in this process).
+
+        :raises: IntrospectionTimeout
+        """
+        try:
+            return self._results[key]
+        except KeyError:
+            pass
+
+        worker = self._acquire()
+        broken = True
+        try:
+            source = worker.generate_code(parser.path, parser.name,
+                                          parser.sys_path,
+                                          settings.introspection_timeout)
+            broken = False
+        except (IOError, OSError, EOFError, ValueError, SyntaxError):
+            debug.warning('introspection failed', parser.name,
+                          sys.exc_info()[1])
+            return None
+        finally:
+            self._release(worker, broken)
+        if source is not None:
+            self._results[key] = source
+        return source
+
+    def _acquire(self):
+        with self._condition:
+            while not self._idle \
+                    and self._count >= settings.introspection_processes:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._count += 1
+        try:
+            return _IntrospectionWorker()
+        except:
+            self._release(None, True)
+            raise
+
+    def _release(self, worker, broken):
+        with self._condition:
+            if broken:
+                self._count -= 1
+                if worker is not None:
+                    worker.kill()
+            else:
+                self._idle.append(worker)
+            self._condition.notify()
+
+    def shutdown(self):
+        """ Kills all idle workers. """
+        with self._condition:
+            for worker in self._idle:
+                worker.kill()
+            self._count -= len(self._idle)
+            self._idle = []
+
+
+introspection_pool = IntrospectionPool()
+atexit.register(introspection_pool.shutdown)
+
+
+def _introspection_worker_main():
+    """ The loop of an introspection worker process. """
+    out = sys.stdout
+    # Modules might print something while importing, which would break the
+    # protocol.
+    sys.stdout = sys.stderr
+    for line in iter(sys.stdin.readline, ''):
+        path, name, sys_path = literal_eval(line)
+        parser = Parser(path=path, name=name, sys_path=sys_path)
+        try:
+            source = _generate_code(parser.module, parser._load_mixins())
+        except Exception:
+            source = None
+        out.write(repr(source) + '\n')
+        out.flush()
+
+
 def _generate_code(scope, mixin_funcs={}, depth=0):
     """
     Generate a string, which uses python syntax as an input to the
@@ -486,3 +732,7 @@ class Builtin(object):
 
 
 Builtin = Builtin()
+
+
+if __name__ == '__main__':
+    _introspection_worker_main()
@@ -1,24 +1,64 @@
+from __future__ import with_statement
+
 import time
+import contextlib
+import threading
+import os
+import sys
+import hashlib
+import mmap
+import struct
+
+from _compatibility import pickle, unicode, property, BytesIO, wraps
 import settings
+import debug
+import common
 
-# memoize caches will be deleted after every action
+# memoize caches will be deleted after every action, if they are not valid
+# anymore
 memoize_caches = []
 
 time_caches = []
 
 star_import_cache = {}
 
+# The generation of every module (by path, or by name for builtins). It
+# changes if the module is parsed again. Memoized results store the
+# generations of the modules they depend on.
+module_generations = {}
+# Results that depend on this key are only valid during the current request
+# (a `Script`), e.g. because a recursion has been cut off. Its "generation" is
+# the id of the request (`common.request`).
+_REQUEST = ('request',)
+
+
+# The memoized results by the modules (and requests) they depend on:
+# ``(path, generation) -> set of (memo, key)`` (the memo as its index in
+# `_memos`). Only the results of a changed module (or a finished
+# request) are deleted, the others are never scanned.
+_dependents = {}
+_memos = []
+# Locks the memos, `_dependents` and `module_generations` (not for reading).
+_lock = threading.Lock()
+
 
-def clear_caches():
+def clear_caches(delete_all=False):
     """ Jedi caches many things, that should be completed after each completion
     finishes.
+
+    :param delete_all: Deletes also the memoized results, which are still
+        valid (their modules didn't change).
     """
     global memoize_caches
 
-    # memorize_caches must never be deleted, because the dicts will get lost in
-    # the wrappers.
-    for m in memoize_caches:
-        m.clear()
+    end_request()
+    with _lock:
+        if delete_all:
+            # the memos must never be deleted, because the dicts will get lost
+            # in the wrappers.
+            for m in _memos:
+                m.clear()
+            _dependents.clear()
 
     for tc in time_caches:
         # check time_cache for expired entries
@@ -28,27 +68,175 @@ def clear_caches():
                 del tc[key]
 
 
-def memoize_default(default=None, cache=memoize_caches):
+def new_request():
+    """
+    Starts a new request in this thread (see `common.RequestState`). The
+    results, that are only valid during the old request, are deleted.
+    """
+    with _lock:
+        _drop(_REQUEST, common.request.id)
+        common.request.new()
+
+
+def end_request():
+    """ Ends the request of this thread, like :func:`new_request`. """
+    with _lock:
+        _drop(_REQUEST, common.request.end())
+
+
+def module_changed(path):
+    """ Invalidates the memoized results, that depend on the module `path`.
+    """
+    with _lock:
+        generation = module_generations.get(path, 0)
+        module_generations[path] = generation + 1
+        _drop(path, generation)
+
+
+def _drop(path, generation):
+    """ Deletes the results, that depend on `generation` of `path`. """
+    for index, key in _dependents.pop((path, generation), ()):
+        memo = _memos[index]
+        cached = memo.get(key)
+        # the key may have been stored again in the meantime
+        if cached is not None and cached[1].get(path) == generation:
+            del memo[key]
+            _unindex(index, key, cached[1])
+
+
+def _unindex(index, key, dependencies):
+    for dependency in dependencies.items():
+        keys = _dependents.get(dependency)
+        if keys is not None:
+            keys.discard((index, key))
+            if not keys:
+                del _dependents[dependency]
+
+
+def _store(index, key, rv, dependencies):
+    with _lock:
+        if not _is_valid(dependencies):
+            # a module changed during the evaluation
+            return
+        memo = _memos[index]
+        if key in memo:
+            _unindex(index, key, memo[key][1])
+        memo[key] = rv, dependencies, _current_request()
+        for dependency in dependencies.items():
+            try:
+                _dependents[dependency].add((index, key))
+            except KeyError:
+                _dependents[dependency] = set([(index, key)])
+
+
+@contextlib.contextmanager
+def listening():
+    """ Don't use the memoized results of former requests in this block. """
+    common.request.listening += 1
+    try:
+        yield
+    finally:
+        common.request.listening -= 1
+
+
+def _generation(path):
+    if path == _REQUEST:
+        return common.request.id
+    return module_generations.get(path, 0)
+
+
+def add_dependency(path):
+    """ The memoized functions, that are being executed, depend on `path`. """
+    stack = common.request.dependency_stack
+    if stack:
+        stack[-1][path] = _generation(path)
+
+
+def mark_incomplete():
+    """
+    The results of the memoized functions, that are being executed, are only
+    valid for the current request.
+    """
+    add_dependency(_REQUEST)
+
+
+def _current_request():
+    return common.request.id
+
+
+def _is_valid(dependencies):
+    for path, generation in dependencies.items():
+        if _generation(path) != generation:
+            return False
+    return True
+
+
+def _add_argument_dependencies(dependencies, args):
+    """ Parser objects depend on the module they are defined in. """
+    for arg in args:
+        if isinstance(arg, type):
+            continue
+        try:
+            path = arg.get_parent_until().path
+        except (AttributeError, NotImplementedError):
+            continue
+        dependencies[path] = _generation(path)
+
+
+def memoize_default(default=None, cache=memoize_caches, reuse=False):
     """ This is a typical memoization decorator, BUT there is one difference:
     To prevent recursion it sets defaults.
 
     Preventing recursion is in this case the much bigger use than speed. I
     don't think, that there is a big speed difference, but there are many cases
     where recursion could happen (think about a = b; b = a).
+
+    The results survive multiple requests, as long as the modules of the
+    arguments (and of all the memoized calls in between) don't change.
+
+    :param reuse: Use the results of former requests also in a
+        :func:`listening` block.
     """
     def func(function):
         memo = {}
         cache.append(memo)
+        index = len(_memos)
+        _memos.append(memo)
 
+        @wraps(function)
         def wrapper(*args, **kwargs):
             key = (args, frozenset(kwargs.items()))
-            if key in memo:
-                return memo[key]
-            else:
-                memo[key] = default
+            state = common.request
+            running_key = id(memo), key
+            if running_key in state.running:
+                # a recursion, the default is not the real result
+                mark_incomplete()
+                return default
+            # Other threads may change the memo, it's only read once.
+            cached = memo.get(key)
+            if cached is not None:
+                rv, dependencies, request = cached
+                if _is_valid(dependencies) and (reuse or not state.listening
+                                    or request == _current_request()):
+                    if state.dependency_stack:
+                        state.dependency_stack[-1].update(dependencies)
+                    return rv
+
+            state.running.add(running_key)
+            dependencies = {}
+            _add_argument_dependencies(dependencies, args)
+            state.dependency_stack.append(dependencies)
+            try:
                 rv = function(*args, **kwargs)
-                memo[key] = rv
-                return rv
+            finally:
+                state.dependency_stack.pop()
+                state.running.discard(running_key)
+            if not common.deadline_expired():
+                # otherwise the result may be incomplete
+                _store(index, key, rv, dependencies)
+            if state.dependency_stack:
+                state.dependency_stack[-1].update(dependencies)
+            return rv
         return wrapper
     return func
 
@@ -58,7 +246,7 @@ class CachedMetaClass(type):
     caches class initializations. I haven't found any other way, so I do it
     with meta classes.
     """
-    @memoize_default()
+    @memoize_default(reuse=True)
     def __call__(self, *args, **kwargs):
         return super(CachedMetaClass, self).__call__(*args, **kwargs)
 
@@ -81,7 +269,7 @@ def time_cache(time_add_setting):
                     return value
             value = optional_callable()
             time_add = getattr(settings, time_add_setting)
-            if key is not None:
+            if key is not None and not common.deadline_expired():
                 dct[key] = time.time() + time_add, value
             return value
         return wrapper
@@ -105,7 +293,8 @@ def cache_star_import(func):
         # cache is too old and therefore invalid or not available
         invalidate_star_import_cache(scope)
         mods = func(scope, *args, **kwargs)
-        star_import_cache[scope] = time.time(), mods
+        if not common.deadline_expired():
+            star_import_cache[scope] = time.time(), mods
 
         return mods
     return wrapper
@@ -129,3 +318,510 @@ def invalidate_star_import_cache(module, only_main=False):
         for key, (t, mods) in list(star_import_cache.items()):
             if module in mods:
                 invalidate_star_import_cache(key)
+
+
+class ModuleCache(object):
+    """
+    Contains the parsed modules (``key -> (timestamp, parser)``), like a dict.
+    If the modules use more memory than :data:`settings.module_cache_memory`,
+    the least recently used modules are removed. Pinned modules (the open
+    buffers) are never removed, neither is the :attr:`buffer`. It may be used
+    by several threads.
+
+    :param on_evict: Called with the key and the parser of a removed module.
+    """
+    bytes_per_char = 65
+    """
+    A parsed module needs about this many bytes per character of its source
+    (measured with CPython 3 and the standard library).
+    """
+
+    def __init__(self, on_evict=None):
+        self.on_evict = on_evict
+        self.pinned = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._modules = {}
+        self._sizes = {}
+        self._last_used = {}
+        self._clock = 0
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    @property
+    def buffer(self):
+        """ The key of the module of the current `Script` (in this thread).
+        """
+        return getattr(self._local, 'buffer', None)
+
+    @buffer.setter
+    def buffer(self, key):
+        self._local.buffer = key
+
+    def __getitem__(self, key):
+        with self._lock:
+            try:
+                value = self._modules[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self.hits += 1
+            self._touch(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._modules[key] = value
+            self._sizes[key] = self._estimate_size(value[1])
+            self._touch(key)
+            self._evict(key)
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._modules[key]
+            del self._sizes[key]
+            del self._last_used[key]
+
+    def __contains__(self, key):
+        return key in self._modules
+
+    def __len__(self):
+        return len(self._modules)
+
+    def items(self):
+        return list(self._modules.items())
+
+    def clear(self):
+        with self._lock:
+            self._modules.clear()
+            self._sizes.clear()
+            self._last_used.clear()
+
+    def pin(self, key):
+        """ The module `key` is an open buffer and is never removed. """
+        self.pinned.add(key)
+
+    def unpin(self, key):
+        self.pinned.discard(key)
+
+    @property
+    def size(self):
+        """ The estimated memory (in bytes) of all cached modules. """
+        return sum(list(self._sizes.values()))
+
+    def info(self):
+        """ Returns the size, the limit and the statistics as a dict. """
+        limit = settings.module_cache_memory
+        return {
+            'modules': len(self),
+            'size': self.size,
+            'limit': None if limit is None else limit * 1024 * 1024,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _touch(self, key):
+        self._clock += 1
+        self._last_used[key] = self._clock
+
+    def _evict(self, current):
+        """ Removes modules until the limit is kept, except `current`. """
+        if settings.module_cache_memory is None:
+            return
+        limit = settings.module_cache_memory * 1024 * 1024
+        size = self.size
+        candidates = [(t, key) for key, t in self._last_used.items()
+                            if key not in (current, self.buffer)
+                            and key not in self.pinned]
+        candidates.sort()
+        for t, key in candidates:
+            if size <= limit:
+                break
+            size -= self._sizes[key]
+            timestamp, parser = self._modules[key]
+            del self[key]
+            self.evictions += 1
+            debug.dbg('module cache: removed %s' % (key,))
+            if self.on_evict is not None:
+                self.on_evict(key, parser)
+
+    def _estimate_size(self, parser):
+        try:
+            length = sum(len(p.code) for p in parser.parsers)
+        except AttributeError:
+            # not a `FastParser`, guess the length of the source
+            length = parser.module.end_pos[0] * 40
+        return length * self.bytes_per_char
+
+
+class ModulePickling(object):
+    """
+    Pickles parsed modules to :data:`settings.cache_directory`, so that they
+    don't have to be parsed again on the next start.
+
+    Every module gets its own file. A file starts with a small pickled header
+    (modification time, size and md5 hash of the source), which is followed by
+    the pickled parser. The header can therefore be checked without loading
+    the (much bigger) parser.
+    """
+    version = 5
+    """
+    Version number (integer) for file system cache.
+
+    Increment this number when there are any incompatible changes in
+    parser representation classes.  For example, the following changes
+    are regarded as incompatible.
+
+    - Class name is changed.
+    - Class is moved to another module.
+    - Attributes of a parser class are renamed.
+    """
+
+    def __init__(self):
+        self.py_version = '%s.%s' % sys.version_info[:2]
+
+    def load_module(self, path, source):
+        """ Returns the cached parser of `path` or None, if there's no valid
+        cache entry for `source`. """
+        if not settings.use_filesystem_cache:
+            return None
+        try:
+            with open(self._get_hashed_path(path), 'rb') as f:
+                header = pickle.load(f)
+                if not self._is_valid(header, path, source):
+                    return None
+                parser = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError,
+                AttributeError, ImportError, ValueError):
+            # Not there or written by an incompatible version.
+            return None
+        debug.dbg('pickle loaded', path)
+        return parser
+
+    def save_module(self, path, source, parser):
+        if not settings.use_filesystem_cache:
+            return
+        try:
+            header = self.get_header(path, source)
+        except OSError:
+            return
+        self._dump(self._get_hashed_path(path), [header, parser])
+
+    def get_header(self, path, source):
+        """ The modification time, size and hash of a module's source. """
+        return os.path.getmtime(path), len(source), self._hash(source)
+
+    def _dump(self, file_path, objects):
+        """ Pickles `objects` one after another into `file_path`. """
+        directory = self._get_cache_directory()
+        # Write to a temporary file first, other processes should never see a
+        # half written file.
+        temp_path = '%s.%s.tmp' % (file_path, os.getpid())
+        try:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(temp_path, 'wb') as f:
+                for obj in objects:
+                    pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, file_path)
+        except (IOError, OSError, pickle.PicklingError, RuntimeError,
+                TypeError):
+            # RuntimeError: Very deeply nested parse trees exceed the
+            # recursion limit of pickle.
+            debug.warning('pickling of %s failed: %s' % (file_path,
+                                                         sys.exc_info()[1]))
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def load_generated_source(self, key):
+        """ Returns the source, that was generated for the builtin module
+        identified by `key` or None, if it is not cached. """
+        if not settings.use_filesystem_cache:
+            return None
+        try:
+            with open(self._get_hashed_path(repr(key)), 'rb') as f:
+                cached_key, source = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError,
+                ValueError):
+            return None
+        return source if cached_key == key else None
+
+    def save_generated_source(self, key, source):
+        """ Introspecting compiled modules means importing them, which is
+        slow. The generated source is therefore stored as well. """
+        if not settings.use_filesystem_cache:
+            return
+        self._dump(self._get_hashed_path(repr(key)), [(key, source)])
+
+    def load_index(self, directory):
+        """ Returns the :class:`dynamic.NameIndex` data of `directory` or
+        None. """
+        if not settings.use_filesystem_cache:
+            return None
+        key = 'index', directory
+        try:
+            with open(self._get_hashed_path(repr(key)), 'rb') as f:
+                cached_key, files = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError,
+                ValueError):
+            return None
+        return files if cached_key == key else None
+
+    def save_index(self, directory, files):
+        if not settings.use_filesystem_cache:
+            return
+        key = 'index', directory
+        self._dump(self._get_hashed_path(repr(key)), [(key, files)])
+
+    def _is_valid(self, header, path, source):
+        mtime, size, source_hash = header
+        if size != len(source):
+            return False
+        try:
+            if os.path.getmtime(path) == mtime:
+                return True
+        except OSError:
+            return False
+        # The file has been touched, but maybe not changed.
+        return source_hash == self._hash(source)
+
+    def _hash(self, source):
+        if isinstance(source, unicode):
+            source = source.encode('utf-8', 'replace')
+        return hashlib.md5(source).hexdigest()
+
+    def _get_hashed_path(self, path):
+        return os.path.join(self._get_cache_directory(),
+                            '%s.pkl' % self._hash(path))
+
+    def _get_cache_directory(self):
+        return os.path.join(settings.cache_directory, str(self.version),
+                            'python%s' % self.py_version)
+
+
+# is a singleton
+module_pickling = ModulePickling()
+
+
+class StubIndex(object):
+    """
+    The parsers of many modules (e.g. the standard library) in one file, that
+    is written by :mod:`prebuild`. The file is mapped into memory and a parser
+    is only unpickled, if its module is used. A new index is used as soon as
+    it has been written.
+
+    The file contains the pickled parsers, a pickled table ``key -> (offset,
+    length, header)`` and the offset of the table (8 bytes). The key of a
+    Python module is its path (the header is like in `ModulePickling`), the
+    key of a compiled module is the key of its generated source (see
+    `builtin.Parser`).
+
+    The code of a module (the parts of the `fast_parser.FastParser` and the
+    skipped function bodies) is stored as UTF-8 in front of its parser and
+    loaded as `MappedText`. Processes, that use the same index, therefore
+    share the code in the page cache, instead of each having a copy.
+    """
+    min_text_length = 100
+    """ Shorter texts are pickled with the parser. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # file id (path and mtime), memory map, table
+        self._index = None, None, {}
+
+    def get_path(self):
+        return os.path.join(module_pickling._get_cache_directory(),
+                            'stubs.idx')
+
+    def load_module(self, path, source):
+        """ Returns the parser of the Python module `path` or None. """
+        index_map, entry = self._get_entry(path)
+        if entry is None or not module_pickling._is_valid(entry[2], path,
+                                                          source):
+            return None
+        return self._load(index_map, entry)
+
+    def load_builtin(self, key):
+        """ Returns the parser of the compiled module with `key` or None. """
+        index_map, entry = self._get_entry(key)
+        if entry is None:
+            return None
+        return self._load(index_map, entry)
+
+    def write(self, entries, file_path=None):
+        """
+        Writes the index and returns the number of modules in it.
+
+        :param entries: Tuples ``(key, header, parser)``.
+        """
+        if file_path is None:
+            file_path = self.get_path()
+        directory = os.path.dirname(file_path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        # Processes, that use the old index, keep their mapping.
+        temp_path = '%s.%s.tmp' % (file_path, os.getpid())
+        table = {}
+        try:
+            with open(temp_path, 'wb') as f:
+                for key, header, parser in entries:
+                    start = f.tell()
+                    try:
+                        data = self._dump(f, parser)
+                    except (pickle.PicklingError, RuntimeError, TypeError):
+                        debug.warning('pickling of %s failed: %s'
+                                      % (key, sys.exc_info()[1]))
+                        f.seek(start)
+                        f.truncate()
+                        continue
+                    table[key] = f.tell(), len(data), header
+                    f.write(data)
+                offset = f.tell()
+                pickle.dump(table, f, pickle.HIGHEST_PROTOCOL)
+                f.write(struct.pack('>Q', offset))
+            if os.name == 'nt' and os.path.exists(file_path):
+                # Windows doesn't replace files with `rename`
+                os.remove(file_path)
+            os.rename(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return len(table)
+
+    def _get_entry(self, key):
+        """ Returns the memory map and the entry of `key` (or None). """
+        if not settings.use_stub_index:
+            return None, None
+        file_path = self.get_path()
+        try:
+            file_id = file_path, os.path.getmtime(file_path)
+        except OSError:
+            return None, None
+        index = self._index
+        if index[0] != file_id:
+            index = self._open(file_id)
+        return index[1], index[2].get(key)
+
+    def _open(self, file_id):
+        with self._lock:
+            if self._index[0] != file_id:
+                index_map, table = None, {}
+                try:
+                    with open(file_id[0], 'rb') as f:
+                        index_map = mmap.mmap(f.fileno(), 0,
+                                              access=mmap.ACCESS_READ)
+                    offset = struct.unpack('>Q', index_map[-8:])[0]
+                    table = pickle.loads(index_map[offset:-8])
+                except (IOError, OSError, ValueError, EOFError, struct.error,
+                        pickle.UnpicklingError):
+                    debug.warning('stub index %s is broken' % file_id[0])
+                    table = {}
+                self._index = file_id, index_map, table
+            return self._index
+
+    def _get_texts(self, parser):
+        """ The texts of `parser`, that are stored as `MappedText` (by id).
+        """
+        texts = list(getattr(parser, '_parts', []))
+        for p in getattr(parser, 'parsers', [parser]):
+            texts.append(getattr(p, 'code', None))
+            for func in getattr(p.module, '_lazy_functions', []):
+                texts.append(func.__dict__['_lazy_body'][0])
+        # The texts of a parser, that has been loaded from an index, are
+        # `MappedText` already.
+        return dict((id(t), t) for t in texts
+                    if isinstance(t, (unicode, MappedText))
+                    and len(t) >= self.min_text_length)
+
+    def _dump(self, f, parser):
+        """
+        Writes the texts of `parser` to `f` and returns the pickled parser,
+        which refers to them by their position in the file.
+        """
+        texts = self._get_texts(parser)
+        written = {}
+
+        def persistent_id(obj):
+            if id(obj) not in texts:
+                return None
+            try:
+                return written[id(obj)]
+            except KeyError:
+                data = get_text(obj).encode('utf-8')
+                written[id(obj)] = pid = f.tell(), len(data), len(obj)
+                f.write(data)
+                return pid
+
+        output = BytesIO()
+        pickler = pickle.Pickler(output, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = persistent_id
+        pickler.dump(parser)
+        return output.getvalue()
+
+    def _load(self, index_map, entry):
+        offset, length, header = entry
+        texts = {}
+
+        def persistent_load(pid):
+            try:
+                return texts[pid]
+            except KeyError:
+                text_offset, size, text_length = pid
+                texts[pid] = text = MappedText(index_map, text_offset, size,
+                                               text_length)
+                return text
+
+        unpickler = pickle.Unpickler(BytesIO(index_map[offset:
+                                                       offset + length]))
+        unpickler.persistent_load = persistent_load
+        try:
+            return unpickler.load()
+        except (EOFError, pickle.UnpicklingError, AttributeError,
+                ImportError, ValueError, TypeError):
+            # written by an incompatible version
+            return None
+
+
+class MappedText(object):
+    """
+    A text in the memory map of the `StubIndex`, e.g. the code of a skipped
+    function body. It is decoded, when it's used (see `get_text`), and the
+    decoded text isn't kept.
+    """
+    __slots__ = ('_map', '_offset', '_size', '_length')
+
+    def __init__(self, mapping, offset, size, length):
+        self._map = mapping
+        self._offset = offset
+        self._size = size
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def decode(self):
+        return self._map[self._offset:self._offset + self._size] \
+            .decode('utf-8')
+
+    def __reduce__(self):
+        # pickled like the text, the memory map cannot be pickled
+        return unicode, (self.decode(),)
+
+    def __repr__(self):
+        return '<%s: %s@%s>' % (type(self).__name__, self._length,
+                                self._offset)
+
+
+def get_text(text):
+    """ Returns `text` or the decoded text of a `MappedText`. """
+    if isinstance(text, MappedText):
+        return text.decode()
+    return text
+
+
+# is a singleton
+stub_index = StubIndex()
@@ -1,10 +1,14 @@
 """ A universal module with functions / classes without dependencies. """
 import contextlib
+import itertools
+import threading
 import tokenize
+import time
 
 from _compatibility import next
 import debug
 import settings
+import tokenizer
 
 
 class MultiLevelStopIteration(Exception):
@@ -58,11 +62,18 @@ class PushBackIterator(object):
 class NoErrorTokenizer(object):
     def __init__(self, readline, line_offset=0, stop_on_scope=False):
         self.readline = readline
-        self.gen = PushBackIterator(tokenize.generate_tokens(readline))
         self.line_offset = line_offset
         self.stop_on_scope = stop_on_scope
         self.first_scope = False
         self.closed = False
+        self.fast = settings.fast_tokenizer
+        if self.fast:
+            self.gen = PushBackIterator(tokenizer.generate_tokens(readline,
+                                                                line_offset))
+        else:
+            self.gen = PushBackIterator(tokenize.generate_tokens(readline))
+            # equal positions and line numbers share one object (memory)
+            self._positions = {}
 
     def push_last_back(self):
         self.gen.push_back(self.current)
@@ -74,6 +85,12 @@ class NoErrorTokenizer(object):
     def __next__(self):
         if self.closed:
             raise MultiLevelStopIteration()
+        if self.fast:
+            # the positions are right and there are no errors
+            self.current = c = next(self.gen)
+            if self.stop_on_scope and c[2][1] == 0:
+                self._check_scope(c)
+            return c
         try:
             self.current = next(self.gen)
         except tokenize.TokenError:
@@ -96,30 +113,144 @@ class NoErrorTokenizer(object):
             return self.__next__()
 
         c = list(self.current)
+        if self.stop_on_scope and c[2][1] == 0:
+            self._check_scope(c)
+
+        positions = self._positions
+        for i in (2, 3):
+            line, column = c[i]
+            line += self.line_offset
+            line = positions.setdefault(line, line)
+            pos = line, column
+            c[i] = positions.setdefault(pos, pos)
+        return c
 
-        # stop if a new class or definition is started at position zero.
-        breaks = ['def', 'class', '@']
-        if self.stop_on_scope and c[1] in breaks and c[2][1] == 0:
+    def _check_scope(self, token):
+        """ Stop if a new class or definition is started at position zero.
+        """
+        if token[1] in ['def', 'class', '@']:
             if self.first_scope:
                 self.closed = True
                 raise MultiLevelStopIteration()
-            elif c[1] != '@':
+            elif token[1] != '@':
                 self.first_scope = True
 
-        c[2] = self.line_offset + c[2][0], c[2][1]
-        c[3] = self.line_offset + c[3][0], c[3][1]
-        return c
+
+class Deadline(object):
+    """
+    A cancellation token for :class:`api.Script` operations. If the deadline
+    has passed or :meth:`cancel` has been called, the evaluation stops
+    following statements and executions and returns what it has found so far.
+
+    :param timeout: Seconds from now, or None for no time limit.
+    """
+    def __init__(self, timeout=None):
+        if timeout is None:
+            self.end = None
+        else:
+            self.end = time.time() + timeout
+        self.cancelled = False
+
+    def cancel(self):
+        """ May be called from another thread. """
+        self.cancelled = True
+
+    def expired(self):
+        return self.cancelled or self.end is not None \
+                                            and time.time() > self.end
+
+
+_request_ids = itertools.count(1)
+# The ids of the requests, that are evaluated right now (in any thread).
+active_requests = set()
+_requests_lock = threading.Lock()
+
+
+class RequestState(threading.local):
+    """
+    The state of the request (an :class:`api.Script` operation), that is
+    evaluated in the current thread. Every thread has its own state, so
+    several scripts can be evaluated at the same time in different threads.
+    The parsed modules and the memoized results are shared.
+    """
+    def __init__(self):
+        self.deadline = None
+        self.speed_factor = 1
+        # the memoized functions, that are being executed (`cache.py`)
+        self.dependency_stack = []
+        self.running = set()
+        self.listening = 0
+        # not active until `new` is called
+        self.id = next(_request_ids)
+        self._reset()
+
+    def new(self):
+        """ Starts a new request, the state of the old one is deleted. """
+        with _requests_lock:
+            active_requests.discard(self.id)
+            self.id = next(_request_ids)
+            active_requests.add(self.id)
+        self._reset()
+
+    def _reset(self):
+        # the recursion detection of `evaluate.follow_statement`
+        self.current_statement = None
+        # the counters of `helpers.ExecutionRecursionDecorator`
+        self.recursion_level = 0
+        self.parent_execution_funcs = []
+        self.execution_funcs = set()
+        self.execution_count = 0
+        # see `dynamic.search_param_memoize`
+        self.search_param_cache = {}
+
+    def end(self):
+        """
+        Ends the request, returns its id. The evaluations until the next
+        request (e.g. of lazy attributes) get an inactive id.
+        """
+        old = self.id
+        with _requests_lock:
+            active_requests.discard(old)
+            self.id = next(_request_ids)
+        self._reset()
+        return old
+
+    @property
+    def active(self):
+        return self.id in active_requests
+
+
+request = RequestState()
+
+
+@contextlib.contextmanager
+def deadline_scope(deadline):
+    """ Makes `deadline` the current deadline, checked by `deadline_expired`.
+    """
+    old = request.deadline
+    request.deadline = deadline
+    try:
+        yield
+    finally:
+        request.deadline = old
+
+
+def deadline_expired():
+    return request.deadline is not None and request.deadline.expired()
 
 
 @contextlib.contextmanager
 def scale_speed_settings(factor):
-    a = settings.max_executions
-    b = settings.max_until_execution_unique
-    settings.max_executions *= factor
-    settings.max_until_execution_unique *= factor
-    yield
-    settings.max_executions = a
-    settings.max_until_execution_unique = b
+    """
+    Scales :data:`settings.max_executions` and
+    :data:`settings.max_until_execution_unique` for the current request.
+    """
+    old = request.speed_factor
+    request.speed_factor *= factor
+    try:
+        yield
+    finally:
+        request.speed_factor = old
 
 
 def indent_block(text, indention='    '):
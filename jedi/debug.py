@@ -1,6 +1,9 @@
-import inspect
+import os
+import sys
 import time
 
+from _compatibility import wraps
+
 try:
     # Use colorama for nicer console output.
     from colorama import Fore, init
@@ -24,6 +27,9 @@ enable_notice = False
 debug_function = None
 ignored_modules = ['parsing', 'builtin', 'jedi.builtin', 'jedi.parsing']
 
+# receives the profiling spans and counters, see `Collector`
+collector = None
+
 
 def reset_time():
     global start_time
@@ -33,9 +39,9 @@ def reset_time():
 def dbg(*args):
     """ Looks at the stack, to see if a debug message should be printed. """
     if debug_function and enable_notice:
-        frm = inspect.stack()[1]
-        mod = inspect.getmodule(frm[0])
-        if not (mod.__name__ in ignored_modules):
+        # `inspect.stack()` is very slow, it reads the source of every frame
+        mod_name = sys._getframe(1).f_globals.get('__name__')
+        if not (mod_name in ignored_modules):
             debug_function(NOTICE, 'dbg: ' + ', '.join(str(a) for a in args))
 
 
@@ -45,11 +51,131 @@ def warning(*args):
 
 
 def speed(name):
+    if collector is not None:
+        collector.add_span('speed: ' + name, time.time(), 0.0, None)
     if debug_function and enable_speed:
         now = time.time()
         debug_function(SPEED, 'speed: ' + '%s %s' % (name, now - start_time))
 
 
+class Collector(object):
+    """
+    Collects profiling information: Spans (named phases like ``parse``,
+    ``import`` or ``follow_statement`` with a start time and a duration) and
+    counters (e.g. ``fast_parser.reused``). Overwrite :meth:`add_span` and
+    :meth:`increment` to send them somewhere else.
+    """
+    def __init__(self):
+        self.spans = []
+        self.counters = {}
+
+    def add_span(self, name, start, duration, detail):
+        """
+        :param start: The time (`time.time()`) the span started.
+        :param detail: A string (e.g. the path of the parsed module) or None.
+        """
+        self.spans.append((name, start, duration, detail))
+
+    def increment(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        """ Returns a dict ``name -> (number of spans, total duration)``. """
+        result = {}
+        for name, start, duration, detail in self.spans:
+            count, total = result.get(name, (0, 0.0))
+            result[name] = count + 1, total + duration
+        return result
+
+    def chrome_trace(self):
+        """
+        Returns the spans as a dict in the trace event format, which can be
+        viewed with chrome://tracing. The counters are in ``otherData``.
+        """
+        pid = os.getpid()
+        events = []
+        for name, start, duration, detail in self.spans:
+            event = {'name': name, 'ph': 'X', 'pid': pid, 'tid': 0,
+                     'ts': start * 1e6, 'dur': duration * 1e6}
+            if detail is not None:
+                event['args'] = {'detail': detail}
+            events.append(event)
+        return {'traceEvents': events, 'otherData': dict(self.counters)}
+
+    def write_chrome_trace(self, path):
+        try:
+            import json
+        except ImportError:
+            # Python 2.5
+            import simplejson as json
+        f = open(path, 'w')
+        try:
+            json.dump(self.chrome_trace(), f)
+        finally:
+            f.close()
+
+
+class _Span(object):
+    def __init__(self, name, detail):
+        self.name = name
+        self.detail = detail
+
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, *args):
+        if collector is not None:
+            detail = self.detail
+            if detail is not None:
+                detail = str(detail)
+            collector.add_span(self.name, self.start,
+                               time.time() - self.start, detail)
+
+
+class _NoSpan(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+_no_span = _NoSpan()
+
+
+def span(name, detail=None):
+    """
+    A context manager, that measures a span, if there is a `collector`. The
+    `detail` is only converted to a string in that case.
+    """
+    if collector is None:
+        return _no_span
+    return _Span(name, detail)
+
+
+def profiled(name):
+    """ A decorator, that measures every call of a function as a span. """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if collector is None:
+                return func(*args, **kwargs)
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if collector is not None:
+                    collector.add_span(name, start, time.time() - start,
+                                       None)
+        return wrapper
+    return decorator
+
+
+def increment(name, value=1):
+    """ Increments a counter of the `collector`. """
+    if collector is not None:
+        collector.increment(name, value)
+
+
 def print_to_stdout(level, str_out):
     """ The default debug function """
     if level == NOTICE:
@@ -8,8 +8,16 @@ working quite good.
 from __future__ import with_statement
 
 import os
+import sys
+import re
+try:
+    import multiprocessing
+except ImportError:
+    # Python 2.5
+    multiprocessing = None
 
 import cache
+import common
 import parsing
 import modules
 import evaluate
@@ -24,7 +32,186 @@ import fast_parser
 # This is something like the sys.path, but only for searching params. It means
 # that this is the order in which Jedi searches params.
 search_param_modules = ['.']
-search_param_cache = {}
+
+
+class NameIndex(object):
+    """
+    Knows the names, that are used in the Python files of a directory. A
+    dynamic search therefore doesn't have to read every file. Files are only
+    read again, if their modification time changes. With
+    :data:`settings.use_filesystem_cache` the index is also stored on disk.
+    """
+    _name_regex = re.compile(r'[^\W\d]\w*', re.UNICODE)
+
+    def __init__(self):
+        self._directories = {}
+
+    def get_paths(self, directory, name):
+        """ Returns the Python files in `directory`, that use `name`. """
+        files = self._update(directory)
+        return [path for path, (mtime, names) in files.items()
+                if name in names]
+
+    def add_files(self, directory, files):
+        """ Adds ``path -> (mtime, names)`` of files in `directory`. """
+        try:
+            index = self._directories[directory]
+        except KeyError:
+            index = cache.module_pickling.load_index(directory) or {}
+            self._directories[directory] = index
+        index.update(files)
+        cache.module_pickling.save_index(directory, index)
+
+    def uses_name(self, path, name):
+        files = self._update(os.path.dirname(path))
+        try:
+            return name in files[path][1]
+        except KeyError:
+            return False
+
+    def _update(self, directory):
+        """ Returns the index of `directory`: ``path -> (mtime, names)``. """
+        try:
+            files = self._directories[directory]
+        except KeyError:
+            files = cache.module_pickling.load_index(directory) or {}
+            self._directories[directory] = files
+
+        try:
+            entries = os.listdir(directory or os.curdir)
+        except OSError:
+            entries = []
+        changed = False
+        paths = set()
+        for entry in entries:
+            if not entry.endswith('.py'):
+                continue
+            path = os.path.join(directory, entry)
+            paths.add(path)
+            try:
+                mtime = os.path.getmtime(path)
+                if path in files and files[path][0] == mtime:
+                    continue
+                files[path] = mtime, self._read_names(path)
+            except (IOError, OSError, UnicodeError):
+                continue
+            changed = True
+
+        for path in list(files.keys()):
+            if path not in paths:
+                del files[path]
+                changed = True
+        if changed:
+            cache.module_pickling.save_index(directory, files)
+        return files
+
+    def _read_names(self, path):
+        with open(path) as f:
+            source = modules.source_to_unicode(f.read())
+        return self.get_names(source)
+
+    def get_names(self, source):
+        return set(self._name_regex.findall(source))
+
+
+# is a singleton
+name_index = NameIndex()
+
+
+def _summarize_module(path):
+    """
+    Parses a module (in a worker process of `index_project`) and returns a
+    picklable summary or None, if it cannot be read or parsed.
+    """
+    try:
+        return _summary(path)
+    except Exception:
+        # e.g. a file, that cannot be decoded; the others are still indexed
+        debug.warning('cannot index %s: %s' % (path, sys.exc_info()[1]))
+        return None
+
+
+def _summary(path):
+    def scopes(scope):
+        result = []
+        for s in scope.subscopes:
+            result.append((type(s).__name__.lower(), str(s.name),
+                           s.start_pos, s.end_pos))
+            result += scopes(s)
+        return result
+
+    mtime = os.path.getmtime(path)
+    with open(path) as f:
+        source = modules.source_to_unicode(f.read())
+    module = modules.Module(path, source).parser.module
+    used_names = {}
+    for name, stmts in module.used_names.items():
+        used_names[name] = sorted(s.start_pos for s in stmts)
+    return {
+        'mtime': mtime,
+        'names': name_index.get_names(source),
+        'used_names': used_names,
+        'defined_names': sorted([(n.start_pos, str(n))
+                                 for n in module.get_defined_names()]),
+        'imports': [i.get_code().strip() for i in module.get_imports()],
+        'scopes': scopes(module),
+    }
+
+
+def index_project(root, workers=None):
+    """
+    Parses all Python files below `root` in `workers` processes (default:
+    the number of CPUs) and adds them to the :class:`NameIndex`. With
+    :data:`settings.use_filesystem_cache` the workers also pickle the parsed
+    modules, loading them later is therefore fast.
+
+    Returns a dict ``path -> summary``. A summary is a dict with the keys
+    ``mtime``, ``names`` (all identifiers), ``used_names`` (``name ->
+    positions``), ``defined_names`` (``(position, name)``), ``imports`` (the
+    code of the import statements) and ``scopes`` (``(type, name, start_pos,
+    end_pos)`` of all classes and functions).
+    """
+    paths = []
+    for directory, dir_names, file_names in os.walk(os.path.abspath(root)):
+        dir_names[:] = [d for d in dir_names if not d.startswith('.')]
+        paths += [os.path.join(directory, f) for f in sorted(file_names)
+                  if f.endswith('.py')]
+
+    if multiprocessing is not None and workers is None:
+        try:
+            workers = multiprocessing.cpu_count()
+        except NotImplementedError:
+            workers = 1
+
+    if multiprocessing is None or workers == 1 or len(paths) < 2:
+        results = [_summarize_module(p) for p in paths]
+    else:
+        # Spawned (not forked) workers import this module by its name.
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        try:
+            pool = multiprocessing.Pool(workers)
+        finally:
+            sys.path.pop(0)
+        try:
+            chunk_size = max(1, len(paths) // (workers * 4))
+            results = pool.map(_summarize_module, paths, chunk_size)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    summaries = {}
+    directories = {}
+    for path, summary in zip(paths, results):
+        if summary is not None:
+            summaries[path] = summary
+            files = directories.setdefault(os.path.dirname(path), {})
+            files[path] = summary['mtime'], summary['names']
+    for directory, files in directories.items():
+        name_index.add_files(directory, files)
+    return summaries
 
 
 def get_directory_modules_for_name(mods, name):
@@ -36,16 +223,10 @@ def get_directory_modules_for_name(mods, name):
             return builtin.CachedModule.cache[path][1].module
         except KeyError:
             try:
-                return check_fs(path)
+                return modules.Module(path).parser.module
             except IOError:
                 return None
 
-    def check_fs(path):
-        with open(path) as f:
-            source = modules.source_to_unicode(f.read())
-            if name in source:
-                return modules.Module(path, source).parser.module
-
     # skip non python modules
     mods = set(m for m in mods if m.path.endswith('.py'))
     mod_paths = set()
@@ -54,15 +235,26 @@ def get_directory_modules_for_name(mods, name):
         yield m
 
     if settings.dynamic_params_for_other_modules:
-        paths = set(settings.additional_dynamic_modules)
-        for p in mod_paths:
-            d = os.path.dirname(p)
-            for entry in os.listdir(d):
-                if entry not in mod_paths:
-                    if entry.endswith('.py'):
-                        paths.add(d + os.path.sep + entry)
-
-        for p in paths:
+        module_cache = builtin.CachedModule.cache
+        directories = set(os.path.dirname(p) for p in mod_paths)
+        paths = set()
+        for d in directories:
+            paths |= set(p for p in name_index.get_paths(d, name)
+                         if p not in module_cache)
+
+        # Cached modules might differ from their files (e.g. buffers).
+        others = [os.path.abspath(p)
+                  for p in settings.additional_dynamic_modules]
+        others += [p for p, value in module_cache.items()
+                   if os.path.dirname(p) in directories]
+        for p in others:
+            if p in module_cache:
+                if name in module_cache[p][1].module.used_names:
+                    paths.add(p)
+            elif name_index.uses_name(p, name):
+                paths.add(p)
+
+        for p in paths - mod_paths:
             c = check_python_file(p)
             if c is not None and c not in mods:
                 yield c
@@ -75,26 +267,31 @@ def search_param_memoize(func):
     """
     def wrapper(*args, **kwargs):
         key = (args, frozenset(kwargs.items()))
+        search_param_cache = common.request.search_param_cache
         if key in search_param_cache:
             return search_param_cache[key]
         else:
             rv = func(*args, **kwargs)
-            search_param_cache[key] = rv
+            if not common.deadline_expired():
+                search_param_cache[key] = rv
             return rv
     return wrapper
 
 
 class ParamListener(object):
     """
-    This listener is used to get the params for a function.
+    This listener is used to get the params for a function. It is only fed by
+    the executions of its own request (other threads share the function).
     """
     def __init__(self):
         self.param_possibilities = []
+        self.request = cache._current_request()
 
     def execute(self, params):
         self.param_possibilities.append(params)
 
 
+@debug.profiled('search_params')
 @cache.memoize_default([])
 def search_params(param):
     """
@@ -109,7 +306,7 @@ def search_params(param):
     recursive madness. Therefore one has to analyse the statements that are
     calling the function, as well as analyzing the incoming params.
     """
-    if not settings.dynamic_params:
+    if not settings.dynamic_params or common.deadline_expired():
         return []
 
     def get_params_for_module(module):
@@ -155,16 +352,22 @@ def search_params(param):
     offset = 1 if arr[0][0] in ['*', '**'] else 0
     param_name = str(arr[0][offset].name)
 
+    if settings.dynamic_params_for_other_modules:
+        # depends on the modules in the directory and the loaded modules
+        cache.mark_incomplete()
+
     # add the listener
     listener = ParamListener()
     func.listeners.add(listener)
 
     result = []
-    # This is like backtracking: Get the first possible result.
-    for mod in get_directory_modules_for_name([current_module], func_name):
-        result = get_params_for_module(mod)
-        if result:
-            break
+    with cache.listening():
+        # This is like backtracking: Get the first possible result.
+        for mod in get_directory_modules_for_name([current_module],
+                                                  func_name):
+            result = get_params_for_module(mod)
+            if result or common.deadline_expired():
+                break
 
     # cleanup: remove the listener; important: should not stick.
     func.listeners.remove(listener)
@@ -429,6 +632,72 @@ def related_name_add_import_modules(definitions, search_name):
     return set(definitions) | new
 
 
+def _scan_calls(arr):
+    """ Returns all Calls in an Array, that start a call path. """
+    result = []
+    for sub in arr:
+        for s in sub:
+            if isinstance(s, parsing.Array):
+                result += _scan_calls(s)
+            elif isinstance(s, parsing.Call):
+                result.append(s)
+                s_new = s
+                while s_new is not None:
+                    if s_new.execution is not None:
+                        result += _scan_calls(s_new.execution)
+                    s_new = s_new.next
+    return result
+
+
+def goto_names(stmt, follow=True):
+    """
+    Follows every name in the statement (or import) `stmt` like
+    `evaluate.goto`. The definitions of a name in a statement are sorted by
+    position. Used for `api.Script.index_names`.
+
+    :param follow: If False, only the names, that `stmt` defines, have
+        definitions. The others are not evaluated and have none.
+    :return: list of tuples ``(parsing.NamePart, definitions)``
+    """
+    result = []
+    if isinstance(stmt, parsing.Import):
+        name_parts = []
+        for i in stmt.get_all_import_names():
+            if i is not stmt.alias:
+                name_parts += i.names
+        for index, name_part in enumerate(name_parts):
+            kill_count = len(name_parts) - index - 1
+            i = imports.ImportPath(stmt, kill_count=kill_count,
+                                   direct_resolve=True)
+            # like `api.Script.goto`, without the modules of star imports
+            # (e.g. `posix` in `os`)
+            definitions = i.follow(is_goto=True)[:1] if follow else []
+            result.append((name_part, definitions))
+        if stmt.alias is not None:
+            # the alias is the name of the defined module
+            result.append((stmt.alias.names[-1], [stmt.alias]))
+        return result
+
+    # NameParts are strings, therefore they are compared by identity
+    set_vars = [n.names[-1] for n in stmt.get_set_vars()]
+    calls = _scan_calls(stmt.get_assignment_calls())
+    for details in stmt.assignment_details:
+        calls += _scan_calls(details[1])
+    for call in calls:
+        call_path = list(call.generate_call_path())
+        for i, name_part in enumerate(call_path):
+            if not isinstance(name_part, parsing.NamePart):
+                continue
+            if [n for n in set_vars if n is name_part]:
+                definitions = [stmt]
+            elif follow:
+                definitions = evaluate.goto(stmt, call_path[:i + 1])[0]
+            else:
+                definitions = []
+            result.append((name_part, definitions))
+    return sorted(result, key=lambda r: r[0].start_pos)
+
+
 def check_flow_information(flow, search_name, pos):
     """ Try to find out the type of a variable just with the information that
     is given by the flows: e.g. It is also responsible for assert checks.
@@ -339,7 +339,8 @@ class Function(use_metaclass(cache.CachedMetaClass, parsing.Base)):
                 if len(dec_results) > 1:
                     debug.warning('multiple decorators found', self.base_func,
                                                             dec_results)
-                decorator = dec_results.pop()
+                # `dec_results` is memoized, don't change it.
+                decorator = next(iter(dec_results))
                 # Create param array.
                 old_func = Function(f, is_decorated=True)
                 params = helpers.generate_param_array([old_func], old_func)
@@ -466,8 +467,9 @@ class Execution(Executable):
     def _get_function_returns(self, evaluate_generator):
         """ A normal Function execution """
         # Feed the listeners, with the params.
-        for listener in self.base.listeners:
-            listener.execute(self.get_params())
+        for listener in list(self.base.listeners):
+            if listener.request == cache._current_request():
+                listener.execute(self.get_params())
         func = self.base.get_decorated_func()
         if func.is_generator and not evaluate_generator:
             return [Generator(func, self.var_args)]
@@ -707,7 +709,24 @@ class Execution(Executable):
         return self.copy_properties('subscopes')
 
     def get_statement_for_position(self, pos):
-        return parsing.Scope.get_statement_for_position(self, pos)
+        """ Like `parsing.Scope.get_statement_for_position` for the copied
+        statements, which have no `parsing.PositionIndex`. """
+        for s in self.statements + self.asserts:
+            if isinstance(s, parsing.Flow):
+                p = s.get_statement_for_position(pos)
+                while s.next and not p:
+                    s = s.next
+                    p = s.get_statement_for_position(pos)
+                if p:
+                    return p
+            elif s.start_pos <= pos < s.end_pos:
+                return s
+
+        for s in self.subscopes:
+            if s.start_pos <= pos <= s.end_pos:
+                p = s.get_statement_for_position(pos)
+                if p:
+                    return p
 
     def __repr__(self):
         return "<%s of %s>" % \
@@ -1307,6 +1326,7 @@ def assign_tuples(tup, results, seek_name):
 
 
 @helpers.RecursionDecorator
+@debug.profiled('follow_statement')
 @cache.memoize_default(default=[])
 def follow_statement(stmt, seek_name=None):
     """
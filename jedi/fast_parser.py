@@ -1,12 +1,20 @@
 import re
 import operator
+import tokenize
 
-from _compatibility import use_metaclass, reduce, property
+from _compatibility import use_metaclass, reduce, property, StringIO
 import settings
 import parsing
+import cache
+import debug
 
 parser_cache = {}
 
+# Splits the code into parts, every part has (at most) one top level
+# class/function.
+_split_parts = re.compile(r'(?:\n(?:def|class|@.*?\n(?:def|class))|^).*?'
+                          r'(?=\n(?:def|class|@)|$)', re.DOTALL)
+
 
 class Module(parsing.Simple, parsing.Module):
     def __init__(self, parsers):
@@ -60,13 +68,18 @@ class Module(parsing.Simple, parsing.Module):
     def get_statement_for_position(self, pos):
         key = 'get_statement_for_position', pos
         if key not in self.cache:
-            for p in self.parsers:
+            # only the parsers of the parts at `pos` are searched
+            if 'parser_intervals' not in self.cache:
+                self.cache['parser_intervals'] = parsing.Intervals(
+                    [(p.module.start_pos, p.module.end_pos, p)
+                     for p in self.parsers])
+            for end, p in self.cache['parser_intervals'].find(pos):
                 s = p.module.get_statement_for_position(pos)
                 if s:
-                    self.cache[key] = s
                     break
             else:
-                self.cache[key] = None
+                s = None
+            self.cache[key] = s
         return self.cache[key]
 
     @property
@@ -75,15 +88,8 @@ class Module(parsing.Simple, parsing.Module):
             raise NotImplementedError("Parser doesn't exist.")
         key = 'used_names'
         if key not in self.cache:
-            dct = {}
-            for p in self.parsers:
-                for k, statement_set in p.module.used_names.items():
-                    if k in dct:
-                        dct[k] |= statement_set
-                    else:
-                        dct[k] = set(statement_set)
-
-            self.cache[key] = dct
+            self.cache[key] = parsing.UsedNames([p.module
+                                                 for p in self.parsers])
         return self.cache[key]
 
     @property
@@ -137,29 +143,41 @@ class Module(parsing.Simple, parsing.Module):
 
 class CachedFastParser(type):
     """ This is a metaclass for caching `FastParser`. """
-    def __call__(self, code, module_path=None, user_position=None):
+    def __call__(self, code, module_path=None, user_position=None,
+                 skeleton=False):
         if not settings.fast_parser:
-            return parsing.PyFuzzyParser(code, module_path, user_position)
+            cache.module_changed(module_path)
+            return parsing.PyFuzzyParser(code, module_path, user_position,
+                                         skeleton=skeleton)
         if module_path is None or module_path not in parser_cache:
             p = super(CachedFastParser, self).__call__(code, module_path,
-                                                            user_position)
+                                                    user_position, skeleton)
             parser_cache[module_path] = p
         else:
             p = parser_cache[module_path]
-            p.update(code, user_position)
+            p.update(code, user_position, skeleton)
         return p
 
 
 class FastParser(use_metaclass(CachedFastParser)):
-    def __init__(self, code, module_path=None, user_position=None):
+    """
+    :param skeleton: See `parsing.PyFuzzyParser`.
+    """
+    def __init__(self, code, module_path=None, user_position=None,
+                 skeleton=False):
         # set values like `parsing.Module`.
         self.module_path = module_path
         self.user_position = user_position
+        self.skeleton = skeleton
 
         self.parsers = []
         self.module = Module(self.parsers)
         self.reset_caches()
 
+        # the parts of the last `_split` and the text after them
+        self._parts = []
+        self._tail = None
+
         self._parse(code)
 
     @property
@@ -185,34 +203,138 @@ class FastParser(use_metaclass(CachedFastParser)):
                     break
         return self._user_stmt
 
-    def update(self, code, user_position=None):
+    def update(self, code, user_position=None, skeleton=False):
         self.user_position = user_position
+        self.skeleton = skeleton
         self.reset_caches()
 
+        # The code of a prebuilt parser is in the stub index (see
+        # `cache.MappedText`).
+        self._parts = [cache.get_text(part) for part in self._parts]
+        for p in self.parsers:
+            p.code = cache.get_text(p.code)
         self._parse(code)
 
+    def set_user_position(self, user_position):
+        """
+        Moves the user position without parsing the code again (e.g. for
+        several requests on one buffer, see `api.batch`).
+        """
+        self.user_position = user_position
+        self.reset_caches()
+        for p in self.parsers:
+            self._scan_user_position(p)
+
+    def _scan_user_position(self, p):
+        """ Sets the user stmt/scope of a parser, that has been parsed before.
+        """
+        m = p.module
+        if self.user_position is not None and \
+                m.start_pos <= self.user_position <= m.end_pos:
+            p.user_stmt = m.get_statement_for_position(self.user_position,
+                                                       include_imports=True)
+            if p.user_stmt:
+                p.user_scope = p.user_stmt.parent
+            else:
+                p.user_scope = self.scan_user_scope(m) or self.module
+
     def scan_user_scope(self, sub_module):
         """ Scan with self.user_position.
         :type sub_module: parsing.SubModule
         """
-        for scope in sub_module.statements + sub_module.subscopes:
-            if isinstance(scope, parsing.Scope):
-                if scope.start_pos <= self.user_position <= scope.end_pos:
-                    return self.scan_user_scope(scope) or scope
+        index = sub_module.get_position_index()
+        for scope in index.find_scopes(self.user_position):
+            return self.scan_user_scope(scope) or scope
         return None
 
+    def _split(self, code):
+        """
+        Splits the code into parts. Only the region, that has changed since
+        the last call, is split again. The unchanged parts are the same
+        string objects as before, therefore their hashes are cached.
+        """
+        parts = self._split_changed(code)
+        if parts is None:
+            parts = _split_parts.findall(code)
+            if len(parts) > 1 and not re.match('def|class|@', parts[0]):
+                # Merge the first two because `common.NoErrorTokenizer` is not
+                # able to know if there's a class/func or not.
+                # Therefore every part has it's own class/func. Exactly one.
+                parts[0] += parts[1]
+                parts.pop(1)
+
+        length = sum(len(p) for p in parts)
+        self._parts = parts
+        # Text that isn't in any part, which only happens at the end (a
+        # newline), if the parts are usable for the next split.
+        self._tail = code[length:] if len(code) - length <= 1 else None
+        return parts
+
+    def _split_changed(self, code):
+        """
+        Returns the same as a full split (see `_split`), but reuses the parts
+        at the beginning and end of the old code that didn't change. Returns
+        None if that's not possible.
+        """
+        old_parts = self._parts
+        if self._tail is None or not old_parts:
+            return None
+
+        # Unchanged parts at the beginning. The last one that matches is not
+        # reused, because it might have been extended.
+        prefix = 0
+        pos = 0
+        for part in old_parts:
+            if not code.startswith(part, pos):
+                break
+            prefix += 1
+            pos += len(part)
+        prefix = max(prefix - 1, 0)
+        start = sum(len(p) for p in old_parts[:prefix])
+
+        # Unchanged parts at the end. The first part is never reused, because
+        # it might have been merged.
+        suffix = 0
+        end = len(code)
+        if code.endswith(self._tail):
+            end -= len(self._tail)
+            for part in reversed(old_parts[max(prefix, 1):]):
+                if end - len(part) < start or not code.endswith(part, 0, end):
+                    break
+                suffix += 1
+                end -= len(part)
+            if not suffix:
+                end = len(code)
+
+        # Split the changed region. Every part has to be exactly the same as
+        # in a full split, otherwise everything is split.
+        middle = []
+        pos = start
+        while pos < end:
+            match = _split_parts.match(code, pos)
+            if match is None or match.end() == pos or match.end() > end:
+                break
+            middle.append(match.group(0))
+            pos = match.end()
+        if pos != end and (suffix or code[pos:] != '\n') or not middle:
+            return None
+
+        suffix_parts = old_parts[len(old_parts) - suffix:]
+        if not prefix and not re.match('def|class|@', middle[0]):
+            # the same merge as in `_split`
+            if len(middle) > 1:
+                middle[0:2] = [middle[0] + middle[1]]
+            elif suffix_parts:
+                middle[0] += suffix_parts.pop(0)
+        return old_parts[:prefix] + middle + suffix_parts
+
     def _parse(self, code):
         """ :type code: str """
-        r = r'(?:\n(?:def|class|@.*?\n(?:def|class))|^).*?' \
-            r'(?=\n(?:def|class|@)|$)'
-        parts = re.findall(r, code, re.DOTALL)
-
-        if len(parts) > 1 and not re.match('def|class|@', parts[0]):
-            # Merge the first two because `common.NoErrorTokenizer` is not able
-            # to know if there's a class/func or not.
-            # Therefore every part has it's own class/func. Exactly one.
-            parts[0] += parts[1]
-            parts.pop(1)
+        old_parts, old_tail = self._parts, self._tail
+        parts = self._split(code)
+        changed = parts != old_parts or self._tail != old_tail \
+                or self._tail is None or settings.fast_parser_always_reparse
+        old_parsers = [(p, p.module.line_offset) for p in self.parsers]
 
         if settings.fast_parser_always_reparse:
             self.parsers[:] = []
@@ -232,26 +354,27 @@ class FastParser(use_metaclass(CachedFastParser)):
                 h = hash(code_part)
 
                 if h in hashes and hashes[h].code == code_part:
-                    p = hashes[h]
-                    del hashes[h]
+                    reused = hashes.pop(h)
+                else:
+                    reused = self._reparse_changed_method(hashes, code_part)
+                    if reused is not None:
+                        reused.hash = h
+
+                if reused is not None:
+                    debug.increment('fast_parser.reused')
+                    p = reused
                     m = p.module
                     m.line_offset += line_offset + 1 - m.start_pos[0]
-                    if self.user_position is not None and \
-                            m.start_pos <= self.user_position <= m.end_pos:
-                        # It's important to take care of the whole user
-                        # positioning stuff, if no reparsing is being done.
-                        p.user_stmt = m.get_statement_for_position(
-                                    self.user_position, include_imports=True)
-                        if p.user_stmt:
-                            p.user_scope = p.user_stmt.parent
-                        else:
-                            p.user_scope = self.scan_user_scope(m) \
-                                            or self.module
+                    # It's important to take care of the whole user
+                    # positioning stuff, if no reparsing is being done.
+                    self._scan_user_position(p)
                 else:
+                    debug.increment('fast_parser.parsed')
                     p = parsing.PyFuzzyParser(code[start:],
                                 self.module_path, self.user_position,
                                 line_offset=line_offset, stop_on_scope=True,
-                                top_module=self.module)
+                                top_module=self.module,
+                                skeleton=self.skeleton)
 
                     p.hash = h
                     p.code = code_part
@@ -262,6 +385,159 @@ class FastParser(use_metaclass(CachedFastParser)):
             line_offset += lines
             start += len(code_part)
         self.parsers[parser_order + 1:] = []
+        if not self.skeleton:
+            # the parts of a skeleton parse are reused e.g. if the user opens
+            # an imported module.
+            for p in self.parsers:
+                p.module.parse_bodies()
+
+        # Memoized results refer to the positions of the old parsers, e.g.
+        # if equal parts have been swapped.
+        if changed or old_parsers != [(p, p.module.line_offset)
+                                      for p in self.parsers]:
+            cache.module_changed(self.module_path)
+
+    def _reparse_changed_method(self, hashes, code):
+        """
+        Editing a method in a big class shouldn't mean that the whole class
+        is parsed again. If only the body of one method changed (and the
+        number of lines is the same), the method is parsed again and put into
+        the old `parsing.Class`.
+
+        :param hashes: The old parsers, that have not been reused.
+        :return: The changed parser (removed from `hashes`) or None.
+        """
+        header = code[:code.find('\n', 1) + 1]
+        line_count = code.count('\n')
+        for h, p in hashes.items():
+            if p.code.startswith(header) and p.code.count('\n') == line_count \
+                    and self._reparse_method(p, code):
+                del hashes[h]
+                return p
+        return None
+
+    def _reparse_method(self, p, code):
+        """ Returns True, if `code` could be put into the parser `p`. """
+        old_lines = p.code.split('\n')
+        new_lines = code.split('\n')
+        changed = [i for i, (old, new) in enumerate(zip(old_lines, new_lines))
+                   if old != new]
+        if not changed or not isinstance(p, parsing.PyFuzzyParser):
+            return False
+
+        m = p.module
+        first_line = m._start_pos[0]
+        start = first_line + changed[0]
+        end = first_line + changed[-1]
+
+        # search the method, whose body contains the changed lines
+        for cls in m.subscopes:
+            if isinstance(cls, parsing.Class) and cls._start_pos[1] == 0:
+                for index, func in enumerate(cls.subscopes):
+                    if isinstance(func, parsing.Function) \
+                            and func._start_pos[0] < start \
+                            and None not in func._end_pos \
+                            and end < func._end_pos[0]:
+                        break
+                else:
+                    continue
+                break
+        else:
+            return False
+
+        header_end = max([func._start_pos[0]] + [s._end_pos[0]
+                         for s in func.params + [func.name]])
+        if start <= header_end:
+            return False
+
+        def get_indent(line):
+            stripped = line.lstrip()
+            if not stripped or stripped.startswith('#'):
+                return None
+            if '\t' in line[:len(line) - len(stripped)]:
+                return -1
+            return len(line) - len(stripped)
+
+        # The changed lines must be indented at least like the first
+        # statement of the body, otherwise they would end the method or
+        # belong to a statement of the header line.
+        indent = func._start_pos[1]
+        for line in old_lines[header_end - first_line + 1:
+                              func._end_pos[0] - first_line]:
+            body_indent = get_indent(line)
+            if body_indent is not None:
+                break
+        else:
+            return False
+        if body_indent <= indent:
+            return False
+        for i in changed:
+            for line in old_lines[i], new_lines[i]:
+                line_indent = get_indent(line)
+                if line_indent is not None and line_indent < body_indent:
+                    return False
+
+        # The method is parsed within a dummy class. The line after it ends
+        # the method like the next statement in the real class. Decorators
+        # would only end the flows of the method, not the method itself.
+        next_line = func._end_pos[0] - first_line
+        if next_line < len(new_lines):
+            next_indent = get_indent(new_lines[next_line])
+            if next_indent is None or not 0 <= next_indent <= indent \
+                    or new_lines[next_line].lstrip().startswith('@'):
+                return False
+        if func._end_pos[1] > indent:
+            return False
+        lines = new_lines[func._start_pos[0] - first_line:
+                          func._end_pos[0] - first_line]
+        lines.append(' ' * func._end_pos[1] + 'pass')
+        source = 'class _:\n%s\n' % '\n'.join(lines)
+
+        # Strings, brackets and backslashes may not continue after the method
+        # and therefore the last line has to start with a dedent.
+        last_line = len(lines) + 1
+        try:
+            for token in tokenize.generate_tokens(StringIO(source).readline):
+                if token[2][0] == last_line:
+                    if token[0] != tokenize.DEDENT:
+                        return False
+                    break
+        except (tokenize.TokenError, IndentationError, SyntaxError):
+            return False
+
+        parser = parsing.PyFuzzyParser(source, self.module_path,
+                                       line_offset=func._start_pos[0] - 2,
+                                       top_module=self.module, node_module=m)
+        # The method has to cover the same lines as before and nothing of it
+        # may end up in the dummy class.
+        dummy = parser.module.subscopes[0]
+        if len(dummy.subscopes) != 1 or dummy.statements:
+            return False
+        new_func = dummy.subscopes[0]
+        if not isinstance(new_func, parsing.Function) \
+                or new_func._start_pos != func._start_pos \
+                or new_func._end_pos != func._end_pos:
+            return False
+
+        # put the new method into the class
+        new_func.parent = func.parent
+        new_func.decorators = func.decorators
+        cls.subscopes[index] = new_func
+        cls.reset_position_index()
+
+        removed = set(n for n in parsing.iter_nodes(func)
+                      if isinstance(n, parsing.Simple))
+        for d in func.decorators:
+            removed -= set(parsing.iter_nodes(d))
+        for name, stmts in list(m._used_names.items()):
+            stmts -= removed
+            if not stmts:
+                del m._used_names[name]
+        for name, stmts in parser.module._used_names.items():
+            m._used_names.setdefault(name, set()).update(stmts)
+
+        p.code = code
+        return True
 
     def reset_caches(self):
         self._user_scope = None
@@ -1,6 +1,8 @@
 import copy
 import contextlib
 
+import common
+import cache
 import parsing
 import evaluate
 import debug
@@ -12,13 +14,19 @@ class RecursionDecorator(object):
     """
     A decorator to detect recursions in statements. In a recursion a statement
     at the same place, in the same module may not be executed two times.
+
+    The statements, that are being followed, belong to the request of the
+    current thread (:data:`common.request`).
     """
     def __init__(self, func):
         self.func = func
-        self.reset()
 
     def __call__(self, stmt, *args, **kwargs):
         #print stmt, len(self.node_statements())
+        if common.deadline_expired():
+            debug.warning('deadline expired', stmt)
+            cache.mark_incomplete()
+            return []
         if self.push_stmt(stmt):
             return []
         else:
@@ -27,35 +35,38 @@ class RecursionDecorator(object):
         return result
 
     def push_stmt(self, stmt):
-        self.current = RecursionNode(stmt, self.current)
+        state = common.request
+        state.current_statement = RecursionNode(stmt,
+                                                state.current_statement)
         if self._check_recursion():
             debug.warning('catched recursion', stmt)
+            cache.mark_incomplete()
             self.pop_stmt()
             return True
         return False
 
     def pop_stmt(self):
-        if self.current is not None:
+        state = common.request
+        if state.current_statement is not None:
             # I don't know how current can be None, but sometimes it happens
             # with Python3.
-            self.current = self.current.parent
+            state.current_statement = state.current_statement.parent
 
     def _check_recursion(self):
-        test = self.current
+        current = test = common.request.current_statement
         while True:
             test = test.parent
-            if self.current == test:
+            if current == test:
                 return True
             if not test:
                 return False
 
     def reset(self):
-        self.top = None
-        self.current = None
+        common.request.current_statement = None
 
     def node_statements(self):
         result = []
-        n = self.current
+        n = common.request.current_statement
         while n:
             result.insert(0, n.stmt)
             n = n.parent
@@ -87,16 +98,21 @@ class RecursionNode(object):
 class ExecutionRecursionDecorator(object):
     """
     Catches recursions of executions.
-    It is designed like a Singelton. Only one instance should exist.
+    It is designed like a Singelton. Only one instance should exist. The
+    counters belong to the request of the current thread
+    (:data:`common.request`).
     """
     def __init__(self, func):
         self.func = func
-        self.reset()
 
     def __call__(self, execution, evaluate_generator=False):
-        debug.dbg('Execution recursions: %s' % execution, self.recursion_level,
-                            self.execution_count, len(self.execution_funcs))
+        state = common.request
+        debug.dbg('Execution recursions: %s' % execution,
+                  state.recursion_level, state.execution_count,
+                  len(state.execution_funcs))
         if self.check_recursion(execution, evaluate_generator):
+            # the result depends on the executions of this request
+            cache.mark_incomplete()
             result = []
         else:
             result = self.func(execution, evaluate_generator)
@@ -105,19 +121,24 @@ class ExecutionRecursionDecorator(object):
 
     @classmethod
     def cleanup(cls):
-        cls.parent_execution_funcs.pop()
-        cls.recursion_level -= 1
+        state = common.request
+        state.parent_execution_funcs.pop()
+        state.recursion_level -= 1
 
     @classmethod
     def check_recursion(cls, execution, evaluate_generator):
-        in_par_execution_funcs = execution.base in cls.parent_execution_funcs
-        in_execution_funcs = execution.base in cls.execution_funcs
-        cls.recursion_level += 1
-        cls.execution_count += 1
-        cls.execution_funcs.add(execution.base)
-        cls.parent_execution_funcs.append(execution.base)
-
-        if cls.execution_count > settings.max_executions:
+        state = common.request
+        in_par_execution_funcs = execution.base in state.parent_execution_funcs
+        in_execution_funcs = execution.base in state.execution_funcs
+        state.recursion_level += 1
+        state.execution_count += 1
+        state.execution_funcs.add(execution.base)
+        state.parent_execution_funcs.append(execution.base)
+
+        if state.execution_count > settings.max_executions \
+                                                    * state.speed_factor:
+            return True
+        if common.deadline_expired():
             return True
 
         if isinstance(execution.base, (evaluate.Generator, evaluate.Array)):
@@ -127,21 +148,22 @@ class ExecutionRecursionDecorator(object):
             return False
 
         if in_par_execution_funcs:
-            if cls.recursion_level > settings.max_function_recursion_level:
+            if state.recursion_level > settings.max_function_recursion_level:
                 return True
-        if in_execution_funcs and \
-                len(cls.execution_funcs) > settings.max_until_execution_unique:
+        if in_execution_funcs and len(state.execution_funcs) \
+                > settings.max_until_execution_unique * state.speed_factor:
             return True
-        if cls.execution_count > settings.max_executions_without_builtins:
+        if state.execution_count > settings.max_executions_without_builtins:
             return True
         return False
 
     @classmethod
     def reset(cls):
-        cls.recursion_level = 0
-        cls.parent_execution_funcs = []
-        cls.execution_funcs = set()
-        cls.execution_count = 0
+        state = common.request
+        state.recursion_level = 0
+        state.parent_execution_funcs = []
+        state.execution_funcs = set()
+        state.execution_count = 0
 
 
 def fast_parent_copy(obj):
@@ -151,11 +173,17 @@ def fast_parent_copy(obj):
     new_elements = {}
 
     def recursion(obj):
+        if isinstance(obj, parsing.Function):
+            # a copy must not parse the body on its own
+            obj.parse_body()
         new_obj = copy.copy(obj)
         new_elements[obj] = new_obj
+        if isinstance(new_obj, parsing.Scope):
+            # the index refers to the old statements
+            new_obj.reset_position_index()
 
-        items = new_obj.__dict__.items()
-        for key, value in items:
+        items = dict(parsing.get_attributes(new_obj))
+        for key, value in items.items():
             # replace parent (first try _parent and then parent)
             if key in ['parent', '_parent', '_parent_stmt'] \
                                                     and value is not None:
@@ -4,6 +4,7 @@ import os
 import pkgutil
 import imp
 import sys
+import bisect
 
 import builtin
 import modules
@@ -12,10 +13,20 @@ import parsing
 import evaluate
 import itertools
 import cache
+import settings
 
 # for debugging purposes only
 imports_processed = 0
 
+# directory -> (request, mtime, entries). The modification time of a
+# directory is checked only once per request.
+_directory_cache = {}
+# (search path, name, builtins) -> (listings, result) of `find_module`
+_resolution_cache = {}
+# directory -> (listing, lower case names, names) of `_module_names`
+_module_names_cache = {}
+_suffixes = imp.get_suffixes()
+
 
 class ModuleNotFound(Exception):
     pass
@@ -92,18 +103,22 @@ class ImportPath(parsing.Base):
         debug.dbg('Generated a nested import: %s' % new)
         return new
 
-    def get_defined_names(self, on_import_stmt=False):
+    def get_defined_names(self, on_import_stmt=False, like=''):
+        """
+        :param like: The start of the module names, that are returned. Other
+            names are not filtered.
+        """
         names = []
         for scope in self.follow():
             if scope is ImportPath.GlobalNamespace:
                 if self.import_stmt.relative_count == 0:
-                    names += self.get_module_names()
+                    names += self.get_module_names(like=like)
 
                 if self.file_path is not None:
                     path = os.path.abspath(self.file_path)
                     for i in range(self.import_stmt.relative_count - 1):
                         path = os.path.dirname(path)
-                    names += self.get_module_names([path])
+                    names += self.get_module_names([path], like)
 
                     if self.import_stmt.relative_count:
                         rel_path = self.get_relative_path() + '/__init__.py'
@@ -116,7 +131,7 @@ class ImportPath(parsing.Base):
                 if on_import_stmt and isinstance(scope, parsing.Module) \
                                         and scope.path.endswith('__init__.py'):
                     pkg_path = os.path.dirname(scope.path)
-                    names += self.get_module_names([pkg_path])
+                    names += self.get_module_names([pkg_path], like)
                 for s, scope_names in evaluate.get_names_for_scope(scope,
                                                     include_builtin=False):
                     for n in scope_names:
@@ -131,18 +146,24 @@ class ImportPath(parsing.Base):
                         names.append(n)
         return names
 
-    def get_module_names(self, search_path=None):
+    def get_module_names(self, search_path=None, like=''):
         """
         Get the names of all modules in the search_path. This means file names
-        and not names defined in the files.
+        and not names defined in the files. Only names starting with `like`
+        are returned.
         """
         if not search_path:
             search_path = self.sys_path_with_modifications()
         names = []
-        for module_loader, name, is_pkg in pkgutil.iter_modules(search_path):
-            inf_pos = (float('inf'), float('inf'))
-            names.append(parsing.Name(self.GlobalNamespace, [(name, inf_pos)],
-                                        inf_pos, inf_pos, self.import_stmt))
+        found = set()
+        for directory in search_path:
+            for name in _module_names(directory, like):
+                if name in found:
+                    continue
+                found.add(name)
+                inf_pos = (float('inf'), float('inf'))
+                names.append(parsing.Name(self.GlobalNamespace,
+                        [(name, inf_pos)], inf_pos, inf_pos, self.import_stmt))
         return names
 
     def sys_path_with_modifications(self):
@@ -160,6 +181,7 @@ class ImportPath(parsing.Base):
         module = self.import_stmt.get_parent_until()
         return in_path + modules.sys_path_with_modifications(module)
 
+    @debug.profiled('import')
     def follow(self, is_goto=False):
         """
         Returns the imported modules.
@@ -173,6 +195,8 @@ class ImportPath(parsing.Base):
                 scope, rest = self._follow_file_system()
             except ModuleNotFound:
                 debug.warning('Module not found: ' + str(self.import_stmt))
+                # the module might be created later
+                cache.mark_incomplete()
                 evaluate.follow_statement.pop_stmt()
                 return []
 
@@ -223,19 +247,10 @@ class ImportPath(parsing.Base):
             global imports_processed
             imports_processed += 1
             if path is not None:
-                return imp.find_module(string, [path])
+                return find_module(string, [path])
             else:
                 debug.dbg('search_module', string, self.file_path)
-                # Override the sys.path. It works only good that way.
-                # Injecting the path directly into `find_module` did not work.
-                sys.path, temp = sys_path_mod, sys.path
-                try:
-                    i = imp.find_module(string)
-                except ImportError:
-                    sys.path = temp
-                    raise
-                sys.path = temp
-                return i
+                return find_module(string, sys_path_mod, builtins=True)
 
         if self.file_path:
             sys_path_mod = list(self.sys_path_with_modifications())
@@ -265,29 +280,27 @@ class ImportPath(parsing.Base):
                             'The module you searched has not been found')
 
         sys_path_mod.pop(0)  # TODO why is this here?
-        path = current_namespace[1]
-        is_package_directory = current_namespace[2][2] == imp.PKG_DIRECTORY
-
-        f = None
-        if is_package_directory or current_namespace[0]:
-            # is a directory module
-            if is_package_directory:
-                path += '/__init__.py'
-                with open(path) as f:
-                    source = f.read()
-            else:
-                source = current_namespace[0].read()
-                current_namespace[0].close()
-            if path.endswith('.py'):
-                f = modules.Module(path, source)
-            else:
-                f = builtin.Parser(path=path)
-        else:
-            f = builtin.Parser(name=path)
-
+        f = get_cached_module(current_namespace[1], current_namespace[2][2])
         return f.parser.module, rest
 
 
+def get_cached_module(path, module_type):
+    """
+    Returns the `builtin.CachedModule` of a module, that has been found by
+    `find_module`.
+    """
+    if module_type in (imp.C_BUILTIN, imp.PY_FROZEN):
+        return builtin.Parser(name=path)
+    if module_type == imp.PKG_DIRECTORY:
+        # is a directory module
+        path += '/__init__.py'
+    if path.endswith('.py'):
+        with open(path) as f:
+            source = f.read()
+        return modules.Module(path, source)
+    return builtin.Parser(path=path)
+
+
 def strip_imports(scopes):
     """
     Here we strip the imports - they don't get resolved necessarily.
@@ -302,6 +315,142 @@ def strip_imports(scopes):
     return result
 
 
+def _list_directory(directory):
+    """
+    Returns the entries of `directory` as a frozenset (empty, if it doesn't
+    exist). They are cached until the modification time of the directory
+    changes.
+    """
+    request = cache._current_request()
+    try:
+        checked, mtime, entries = _directory_cache[directory]
+        if checked == request:
+            return entries
+    except KeyError:
+        mtime = entries = None
+
+    try:
+        new_mtime = os.stat(directory or os.curdir).st_mtime
+    except OSError:
+        new_mtime = None
+    if new_mtime is None:
+        entries = frozenset()
+    elif new_mtime != mtime:
+        try:
+            entries = frozenset(os.listdir(directory or os.curdir))
+        except OSError:
+            entries = frozenset()
+    _directory_cache[directory] = request, new_mtime, entries
+    return entries
+
+
+def find_module(name, search_path, builtins=False):
+    """
+    Like `imp.find_module`, but only with cached directory listings (negative
+    lookups therefore don't need any calls to `stat`) and the file is not
+    opened, the first element of the result is always None.
+
+    :param builtins: Search also builtin and frozen modules (like
+        `imp.find_module` without a path).
+    """
+    key = tuple(search_path), name, builtins
+    try:
+        listings, result = _resolution_cache[key]
+    except KeyError:
+        pass
+    else:
+        if [_list_directory(d) for d in listings[::2]] == listings[1::2]:
+            debug.increment('imports.cached')
+            if result is None:
+                raise ImportError('No module named ' + name)
+            return result
+
+    debug.increment('imports.resolved')
+    listings = []
+
+    def find():
+        if builtins:
+            if name in sys.builtin_module_names:
+                return None, name, ('', '', imp.C_BUILTIN)
+            if imp.is_frozen(name):
+                return None, name, ('', '', imp.PY_FROZEN)
+
+        for directory in search_path:
+            entries = _list_directory(directory)
+            listings.extend([directory, entries])
+            if name in entries:
+                package = os.path.join(directory, name)
+                package_entries = _list_directory(package)
+                listings.extend([package, package_entries])
+                for suffix, mode, module_type in _suffixes:
+                    if '__init__' + suffix in package_entries:
+                        return None, package, ('', '', imp.PKG_DIRECTORY)
+            for suffix, mode, module_type in _suffixes:
+                if name + suffix in entries:
+                    return None, os.path.join(directory, name + suffix), \
+                                                (suffix, mode, module_type)
+        return None
+
+    result = find()
+    _resolution_cache[key] = listings, result
+    if result is None:
+        raise ImportError('No module named ' + name)
+    return result
+
+
+def _module_names(directory, like=''):
+    """
+    Returns the names of the modules in `directory` (like
+    `pkgutil.iter_modules`), that start with `like`. They are searched again
+    only if the listing of the directory changes.
+    """
+    entries = _list_directory(directory)
+    try:
+        listing, keys, names = _module_names_cache[directory]
+    except KeyError:
+        listing = None
+    if listing is not entries:
+        if not entries and directory.endswith(('.zip', '.egg')):
+            found = [name for loader, name, is_package
+                     in pkgutil.iter_modules([directory])]
+        else:
+            found = _find_module_names(directory, entries)
+        names = sorted(set(found), key=lambda n: n.lower())
+        keys = [n.lower() for n in names]
+        _module_names_cache[directory] = entries, keys, names
+
+    like_lower = like.lower()
+    result = []
+    for i in range(bisect.bisect_left(keys, like_lower), len(keys)):
+        if not keys[i].startswith(like_lower):
+            break
+        if settings.case_insensitive_completion or names[i].startswith(like):
+            result.append(names[i])
+    return result
+
+
+def _find_module_names(directory, entries):
+    # longer suffixes first, e.g. `.cpython-33m.so` before `.so`
+    suffixes = sorted([s[0] for s in _suffixes], key=len, reverse=True)
+    names = []
+    for entry in entries:
+        for suffix in suffixes:
+            if entry.endswith(suffix):
+                name = entry[:-len(suffix)]
+                break
+        else:
+            if '.' in entry:
+                continue
+            # is it a package?
+            package_entries = _list_directory(os.path.join(directory, entry))
+            if not [s for s in suffixes if '__init__' + s in package_entries]:
+                continue
+            name = entry
+        if name != '__init__' and '.' not in name:
+            names.append(name)
+    return names
+
+
 @cache.cache_star_import
 def remove_star_imports(scope, ignored_modules=[]):
     """
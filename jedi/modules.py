@@ -7,6 +7,7 @@ import tokenize
 import sys
 import os
 import time
+import threading
 
 import cache
 import parsing
@@ -37,6 +38,14 @@ class Module(builtin.CachedModule):
         del self.source  # memory efficiency
         return s
 
+    def _load_prebuilt(self):
+        if not self.path:
+            return None
+        parser = cache.stub_index.load_module(self.path, self.source)
+        if parser is not None:
+            del self.source
+        return parser
+
 
 class ModuleWithCursor(Module):
     """
@@ -64,23 +73,28 @@ class ModuleWithCursor(Module):
     def parser(self):
         """ get the parser lazy """
         if not self._parser:
-            try:
-                ts, parser = builtin.CachedModule.cache[self.path]
-                cache.invalidate_star_import_cache(parser.module)
-
-                del builtin.CachedModule.cache[self.path]
-            except KeyError:
-                pass
-            # Call the parser already here, because it will be used anyways.
-            # Also, the position is here important (which will not be used by
-            # default), therefore fill the cache here.
-            self._parser = fast_parser.FastParser(self.source, self.path,
-                                                        self.position)
-            if self.path is not None:
-                builtin.CachedModule.cache[self.path] = time.time(), \
-                                                        self._parser
+            with self.lock:
+                self._load_buffer()
         return self._parser
 
+    def _load_buffer(self):
+        try:
+            ts, parser = builtin.CachedModule.cache[self.path]
+            cache.invalidate_star_import_cache(parser.module)
+
+            del builtin.CachedModule.cache[self.path]
+        except KeyError:
+            pass
+        # Call the parser already here, because it will be used anyways.
+        # Also, the position is here important (which will not be used by
+        # default), therefore fill the cache here.
+        self._parser = fast_parser.FastParser(self.source, self.path,
+                                                    self.position)
+        if self.path is not None:
+            builtin.CachedModule.cache.buffer = self.path
+            builtin.CachedModule.cache[self.path] = time.time(), \
+                                                    self._parser
+
     def get_path_until_cursor(self):
         """ Get the path under the cursor. """
         result = self._get_path_until_cursor()
@@ -224,6 +238,22 @@ class ModuleWithCursor(Module):
         return self._part_parser
 
 
+# The working directory is changed by one thread at a time.
+_chdir_lock = threading.RLock()
+# path -> lock of the requests of the buffer, see `buffer_lock`
+_buffer_locks = {}
+
+
+def buffer_lock(path):
+    """
+    Scripts of the same buffer share the parser (see
+    :class:`fast_parser.FastParser`), therefore their requests have to wait
+    for each other.
+    """
+    # `setdefault` is atomic, the other lock is thrown away.
+    return _buffer_locks.setdefault(path, threading.RLock())
+
+
 @cache.memoize_default([])
 def sys_path_with_modifications(module):
     def execute_code(code):
@@ -287,17 +317,19 @@ def sys_path_with_modifications(module):
     if module.path is None:
         return []  # support for modules without a path is intentionally bad.
 
-    curdir = os.path.abspath(os.curdir)
-    try:
-        os.chdir(os.path.dirname(module.path))
-    except OSError:
-        pass
-
-    result = check_module(module)
-    result += detect_django_path(module.path)
+    with _chdir_lock:
+        curdir = os.path.abspath(os.curdir)
+        try:
+            os.chdir(os.path.dirname(module.path))
+        except OSError:
+            pass
 
-    # cleanup, back to old directory
-    os.chdir(curdir)
+        try:
+            result = check_module(module)
+            result += detect_django_path(module.path)
+        finally:
+            # cleanup, back to old directory
+            os.chdir(curdir)
     return result
 
 
@@ -29,6 +29,8 @@ as input and ignores just all the non-python stuff. Basically you could feed it
 a perl script, and it should still work (which means throw no error).
 TODO remove docstr params from Scope.__init__()
 """
+from __future__ import with_statement
+
 from _compatibility import (next, literal_eval, StringIO, unicode,
                             property, cleandoc, Python3Method)
 
@@ -36,9 +38,17 @@ import tokenize
 import re
 import keyword
 import os
+import threading
+import bisect
 
 import debug
 import common
+import cache
+
+
+# Bodies of functions are parsed by one thread at a time, see
+# `Function.parse_body`.
+_body_lock = threading.RLock()
 
 
 class ParserError(Exception):
@@ -53,7 +63,13 @@ class Base(object):
 
     I know that there is a chance to do such things with __instancecheck__, but
     since Python 2.5 doesn't support it, I decided to do it this way.
+
+    The parser objects, that exist many times (names, statements, calls), use
+    `__slots__` to save memory. Use :func:`get_attributes` instead of
+    `__dict__`.
     """
+    __slots__ = ()
+
     def isinstance(self, *cls):
         return isinstance(self, cls)
 
@@ -63,6 +79,8 @@ class Simple(Base):
     The super class for Scope, Import, Name and Statement. Every object in
     the parser tree inherits from this class.
     """
+    __slots__ = ('_start_pos', '_end_pos', 'parent', 'set_parent', 'module')
+
     def __init__(self, module, start_pos, end_pos=(None, None)):
         self._start_pos = start_pos
         self._end_pos = end_pos
@@ -223,29 +241,31 @@ class Scope(Simple):
 
     @Python3Method
     def get_statement_for_position(self, pos, include_imports=False):
-        checks = self.statements + self.asserts
-        if include_imports:
-            checks += self.imports
-        if self.isinstance(Function):
-            checks += self.params + self.decorators
-            checks += [r for r in self.returns if r is not None]
-
-        for s in checks:
-            if isinstance(s, Flow):
+        """
+        Returns the statement at `pos`, which may also be in a flow or in a
+        subscope, or None.
+
+        :param include_imports: Returns also an `Import`.
+        """
+        for s, kind in self.get_position_index().find(pos):
+            if kind == PositionIndex.SCOPE:
                 p = s.get_statement_for_position(pos, include_imports)
-                while s.next and not p:
-                    s = s.next
-                    p = s.get_statement_for_position(pos, include_imports)
                 if p:
                     return p
-            elif s.start_pos <= pos < s.end_pos:
+            elif include_imports or kind != PositionIndex.IMPORT:
                 return s
 
-        for s in self.subscopes:
-            if s.start_pos <= pos <= s.end_pos:
-                p = s.get_statement_for_position(pos, include_imports)
-                if p:
-                    return p
+    def get_position_index(self):
+        """ Returns the :class:`PositionIndex`, which is created once. """
+        try:
+            return self.__dict__['_position_index']
+        except KeyError:
+            index = self._position_index = PositionIndex(self)
+            return index
+
+    def reset_position_index(self):
+        """ Has to be called, if the scope is changed after parsing. """
+        self.__dict__.pop('_position_index', None)
 
     def __repr__(self):
         try:
@@ -260,11 +280,172 @@ class Scope(Simple):
                                     self.start_pos[0], self.end_pos[0])
 
 
+class Intervals(object):
+    """
+    Finds the intervals ``[start, end]`` at a position with a binary search.
+
+    :param intervals: Tuples ``(start, end, value)``.
+    """
+    def __init__(self, intervals):
+        self._intervals = sorted((start, end, order, value) for order,
+                                 (start, end, value) in enumerate(intervals)
+                                 if None not in end)
+        self._starts = [i[0] for i in self._intervals]
+        # The biggest end of the intervals until an index: The search stops,
+        # if no interval before can contain the position.
+        self._max_ends = []
+        max_end = None
+        for i in self._intervals:
+            if max_end is None or i[1] > max_end:
+                max_end = i[1]
+            self._max_ends.append(max_end)
+
+    def find(self, pos):
+        """ Returns ``(end, value)`` of the intervals at `pos` in the order of
+        `intervals`. """
+        found = []
+        i = bisect.bisect_right(self._starts, pos)
+        while i > 0 and self._max_ends[i - 1] >= pos:
+            i -= 1
+            start, end, order, value = self._intervals[i]
+            if pos <= end:
+                found.append((order, end, value))
+        found.sort()
+        return [(end, value) for order, end, value in found]
+
+
+class PositionIndex(object):
+    """
+    The statements of a scope (also the ones in flows) and its subscopes,
+    sorted by their positions (see `Intervals`). The ones at a position are
+    therefore found with a binary search, instead of checking all of them.
+
+    The positions are relative to the line offset of the module, which
+    changes if the code above a part of the `fast_parser` changes.
+    """
+    STATEMENT, IMPORT, SCOPE = range(3)
+
+    def __init__(self, scope):
+        self.module = scope.module
+        entries = []
+        self._add_scope(scope, entries)
+        self._nodes = Intervals([(s._start_pos, s._end_pos, (s, kind))
+                                 for s, kind in entries])
+        children = [s for s in scope.statements if isinstance(s, Scope)]
+        self._scopes = Intervals([(s._start_pos, s._end_pos, s)
+                                  for s in children + scope.subscopes])
+
+    def _add_scope(self, scope, entries):
+        """ Adds the entries of `scope` in the order, in which they have
+        been checked by `Scope.get_statement_for_position`. """
+        checks = [(s, self.STATEMENT)
+                  for s in scope.statements + scope.asserts]
+        checks += [(i, self.IMPORT) for i in scope.imports]
+        if scope.isinstance(Function):
+            checks += [(s, self.STATEMENT) for s in scope.params
+                       + scope.decorators + scope.returns if s is not None]
+
+        for s, kind in checks:
+            if isinstance(s, Flow):
+                while s is not None:
+                    self._add_scope(s, entries)
+                    s = s.next
+            else:
+                entries.append((s, kind))
+        for s in scope.subscopes:
+            entries.append((s, self.SCOPE))
+
+    def _relative(self, pos):
+        return pos[0] - self.module.line_offset, pos[1]
+
+    def find(self, pos):
+        """
+        Returns the statements, imports and subscopes at `pos` (as tuples
+        ``(node, kind)``).
+        """
+        pos = self._relative(pos)
+        # the end of a statement is not part of it
+        return [(node, kind) for end, (node, kind) in self._nodes.find(pos)
+                if pos < end or kind == self.SCOPE]
+
+    def find_scopes(self, pos):
+        """ Returns the flows (not the ones after an `else` etc.) and
+        subscopes of the scope at `pos`. """
+        return [s for end, s in self._scopes.find(self._relative(pos))]
+
+
 class Module(object):
     """ For isinstance checks. fast_parser.Module also inherits from this. """
     pass
 
 
+class UsedNames(object):
+    """
+    The statements of `modules` that use a name: ``name -> set``. Skipped
+    function bodies (see :meth:`Function.skip_body`) are only parsed, if they
+    contain the name, that is looked up. Iterating parses all of them.
+    """
+    def __init__(self, modules):
+        self._modules = modules
+        self._names = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._names[name]
+        except KeyError:
+            pass
+        sets = []
+        with _body_lock:
+            for module in self._modules:
+                for func in module._lazy_names.pop(name, []):
+                    func.parse_body()
+                if name in module._used_names:
+                    sets.append(module._used_names[name])
+        if not sets:
+            raise KeyError(name)
+        result = sets[0]
+        if len(sets) > 1:
+            result = set()
+            for stmts in sets:
+                result |= stmts
+        self._names[name] = result
+        return result
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def _all(self):
+        for module in self._modules:
+            module.parse_bodies()
+            for name in module._used_names:
+                yield name
+
+    def keys(self):
+        return list(set(self._all()))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def values(self):
+        return [self[name] for name in self.keys()]
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+
 class SubModule(Scope, Module):
     """
     The top scope, which is always a module.
@@ -276,8 +457,12 @@ class SubModule(Scope, Module):
         self.path = path
         self.global_vars = []
         self._name = None
-        self.used_names = {}
+        self._used_names = {}
         self.temp_used_names = []
+        # functions, whose bodies have not been parsed yet and the names in
+        # these bodies: ``name -> [function]``
+        self._lazy_functions = set()
+        self._lazy_names = {}
         # this may be changed depending on fast_parser
         self.line_offset = 0
 
@@ -300,6 +485,17 @@ class SubModule(Scope, Module):
         n += self.global_vars
         return n
 
+    @property
+    def used_names(self):
+        """ The statements that use a name (see :class:`UsedNames`). """
+        return UsedNames([self])
+
+    def parse_bodies(self):
+        """ Parses the bodies of functions, that have been skipped. """
+        for func in sorted(self._lazy_functions, key=lambda f: f._start_pos):
+            func.parse_body()
+        self._lazy_names.clear()
+
     @property
     def name(self):
         """ This is used for the goto function. """
@@ -367,6 +563,11 @@ class Function(Scope):
     :param docstr: The docstring for the current Scope.
     :type docstr: str
     """
+    # Attributes of the body, which don't exist while the body is skipped
+    # (see :meth:`parse_body`).
+    _body_attributes = ('subscopes', 'imports', 'statements', 'asserts',
+                        'returns', 'is_generator')
+
     def __init__(self, module, name, params, start_pos, annotation):
         super(Function, self).__init__(module, start_pos)
         self.name = name
@@ -385,6 +586,108 @@ class Function(Scope):
             annotation.parent = self.set_parent
             self.annotation = annotation
 
+    def __getattr__(self, name):
+        if name not in self._body_attributes:
+            raise AttributeError(name)
+        # the body has been skipped by the parser
+        self.parse_body()
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def skip_body(self, source, end_indent, names=()):
+        """
+        Removes the body, it is parsed on demand by :meth:`parse_body`.
+
+        :param source: The code of the function, starting with the line of
+            `def`.
+        :param end_indent: The indentation of the line after the function.
+        :param names: The names in the body, the body is parsed if one of them
+            is looked up in :attr:`SubModule.used_names`.
+        """
+        for name in self._body_attributes:
+            del self.__dict__[name]
+        self._lazy_body = source, end_indent
+        self.module._lazy_functions.add(self)
+        for name in names:
+            self.module._lazy_names.setdefault(name, []).append(self)
+
+    def parse_body(self):
+        """
+        Parses the body, if it has been skipped (see `PyFuzzyParser` with
+        `skeleton`). This happens automatically, if one of the
+        attributes of the body is used.
+        """
+        with _body_lock:
+            try:
+                source, end_indent = self.__dict__['_lazy_body']
+            except KeyError:
+                # not skipped or already parsed
+                return
+            debug.increment('parsing.bodies_parsed')
+            # the code might be in the stub index
+            source = cache.get_text(source)
+            line, indent = self._start_pos
+            line_offset = line - 1
+            if indent:
+                # An indented function is parsed within a flow, which has the
+                # indentation of the line after the function, if possible.
+                flow_indent = end_indent if len(end_indent) < indent else ''
+                source = flow_indent + 'if 1:\n' + source
+                line_offset -= 1
+            if not source.endswith('\n'):
+                source += '\n'
+            # The line after the function ends the scopes in the body like in
+            # the whole module.
+            source += end_indent + 'pass'
+            parser = PyFuzzyParser(source, self.module.path,
+                                   line_offset=line_offset,
+                                   node_module=self.module)
+            try:
+                scope = parser.module
+                if indent:
+                    scope = scope.statements[0]
+                new = scope.subscopes[0]
+            except (IndexError, AttributeError):
+                new = None
+
+            body = dict((name, []) for name in self._body_attributes)
+            body['is_generator'] = False
+            if isinstance(new, Function) and new._start_pos == self._start_pos:
+                # the statements of the header exist already
+                header = set()
+                for node in new.params + [getattr(new, 'annotation', None)]:
+                    header.update(iter_nodes(node))
+                used_names = self.module._used_names
+                # not every statement in `used_names` is in the tree (syntax
+                # errors, list comprehensions)
+                roots = [new]
+                for name, stmts in parser.module._used_names.items():
+                    stmts = stmts - header
+                    if stmts:
+                        used_names.setdefault(name, set()).update(stmts)
+                        roots += stmts
+                seen = set()
+                for root in roots:
+                    if id(root) in seen:
+                        continue
+                    for node in iter_nodes(root):
+                        seen.add(id(node))
+                        if getattr(node, 'parent', None) is new:
+                            node.parent = self
+                for name in self._body_attributes:
+                    body[name] = getattr(new, name)
+                self.docstr = new.docstr
+                for name in parser.module.global_vars:
+                    self.module.add_global(name)
+            else:
+                debug.warning('body of %s not parsable' % self)
+
+            self.__dict__.update(body)
+            del self._lazy_body
+            self.module._lazy_functions.discard(self)
+
     def get_code(self, first_indent=False, indention='    '):
         string = "\n".join('@' + stmt.get_code() for stmt in self.decorators)
         params = ','.join([stmt.code for stmt in self.params])
@@ -495,7 +798,8 @@ class Flow(Scope):
     @parent.setter
     def parent(self, value):
         self._parent = value
-        if self.next:
+        # `next` doesn't exist yet, while a flow is unpickled.
+        if getattr(self, 'next', None):
             self.next.parent = value
 
     def get_code(self, first_indent=False, indention='    '):
@@ -668,6 +972,10 @@ class Statement(Simple):
     :param start_pos: Position (line, column) of the Statement.
     :type start_pos: tuple(int, int)
     """
+    __slots__ = ('code', 'used_funcs', 'used_vars', 'token_list', 'set_vars',
+                 '_assignment_calls', '_assignment_details',
+                 '_assignment_calls_calculated')
+
     def __init__(self, module, code, set_vars, used_funcs, used_vars,
                                             token_list, start_pos, end_pos):
         super(Statement, self).__init__(module, start_pos, end_pos)
@@ -883,6 +1191,9 @@ class Param(Statement):
     The class which shows definitions of params of classes and functions.
     But this is not to define function calls.
     """
+    __slots__ = ('position_nr', 'is_generated', 'annotation_stmt',
+                 'parent_function')
+
     def __init__(self, module, code, set_vars, used_funcs, used_vars,
                  token_list, start_pos, end_pos):
         super(Param, self).__init__(module, code, set_vars, used_funcs,
@@ -916,6 +1227,9 @@ class Call(Base):
     NUMBER = 2
     STRING = 3
 
+    __slots__ = ('name', 'parent', 'type', '_start_pos', 'next', 'execution',
+                 '_parent_stmt')
+
     def __init__(self, name, type, start_pos, parent_stmt=None, parent=None):
         self.name = name
         # parent is not the oposite of next. The parent of c: a = [b.c] would
@@ -1018,6 +1332,8 @@ class Array(Call):
     DICT = 'dict'
     SET = 'set'
 
+    __slots__ = ('values', 'arr_el_pos', 'keys', '_end_pos')
+
     def __init__(self,  start_pos, arr_type=NOARRAY, parent_stmt=None,
                                                    parent=None, values=None):
         super(Array, self).__init__(None, arr_type, start_pos, parent_stmt,
@@ -1151,6 +1467,10 @@ class NamePart(str):
         self.parent = parent
         return self
 
+    def __getnewargs__(self):
+        """ Needed for pickling, `str` only passes itself to `__new__`. """
+        return str(self), self.parent, self._start_pos
+
     @property
     def start_pos(self):
         offset = self.parent.module.line_offset
@@ -1168,6 +1488,8 @@ class Name(Simple):
     So a name like "module.class.function"
     would result in an array of [module, class, function]
     """
+    __slots__ = ('names',)
+
     def __init__(self, module, names, start_pos, end_pos, parent=None):
         super(Name, self).__init__(module, start_pos, end_pos)
         self.names = tuple(n if isinstance(n, NamePart) else
@@ -1188,6 +1510,8 @@ class Name(Simple):
 
 class ListComprehension(object):
     """ Helper class for list comprehensions """
+    __slots__ = ('stmt', 'middle', 'input')
+
     def __init__(self, stmt, middle, input):
         self.stmt = stmt
         self.middle = middle
@@ -1203,6 +1527,69 @@ class ListComprehension(object):
         return "%s for %s in %s" % tuple(code)
 
 
+_slot_names = {}
+
+
+def get_attributes(obj):
+    """
+    Returns the attributes of `obj` as ``(name, value)`` pairs, the ones in
+    `__dict__` as well as the ones in `__slots__`.
+    """
+    cls = type(obj)
+    try:
+        names = _slot_names[cls]
+    except KeyError:
+        names = []
+        for c in cls.__mro__:
+            names += c.__dict__.get('__slots__', ())
+        _slot_names[cls] = names
+
+    result = list(getattr(obj, '__dict__', {}).items())
+    for name in names:
+        try:
+            result.append((name, getattr(obj, name)))
+        except AttributeError:
+            # not set
+            pass
+    return result
+
+
+# Attributes of parser objects, that don't point to children.
+_not_children = ('parent', '_parent', 'set_parent', 'parent_function',
+                 '_parent_stmt', 'module', 'top_module')
+
+
+def iter_nodes(node):
+    """
+    Iterates over `node` and all the parser objects (`Simple`, `Call`,
+    `NamePart`, ...) below it. Parents are never followed.
+    """
+    def children(value):
+        if isinstance(value, dict):
+            value = value.values()
+        elif not isinstance(value, (list, tuple, set)):
+            value = [value]
+        for v in value:
+            if isinstance(v, (list, tuple, set, dict)):
+                for c in children(v):
+                    yield c
+            elif isinstance(v, (Base, NamePart, ListComprehension)):
+                yield v
+
+    seen = set([id(node)])
+    stack = [node]
+    while stack:
+        obj = stack.pop()
+        yield obj
+        for key, value in get_attributes(obj):
+            if key in _not_children:
+                continue
+            for child in children(value):
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append(child)
+
+
 class PyFuzzyParser(object):
     """
     This class is used to parse a Python file, it then divides them into a
@@ -1217,17 +1604,24 @@ class PyFuzzyParser(object):
     :param no_docstr: If True, a string at the beginning is not a docstr.
     :param stop_on_scope: Stop if a scope appears -> for fast_parser
     :param top_module: Use this module as a parent instead of `self.module`.
+    :param node_module: The module of the parsed objects instead of
+        `self.module`, e.g. for code that is put into an existing module.
+    :param skeleton: Skip the bodies of functions, they are parsed when they
+        are needed (see :meth:`Function.parse_body`). For modules, that are
+        not edited by the user (ignored with a `user_position`).
     """
     def __init__(self, code, module_path=None, user_position=None,
                         no_docstr=False, line_offset=0, stop_on_scope=None,
-                        top_module=None):
+                        top_module=None, skeleton=False, node_module=None):
         self.user_position = user_position
         self.user_scope = None
         self.user_stmt = None
         self.no_docstr = no_docstr
+        self.skeleton = skeleton and user_position is None
 
         # initialize global Scope
         self.module = SubModule(module_path, (line_offset + 1, 0), top_module)
+        self.node_module = node_module or self.module
         self.scope = self.module
         self.current = (None, None)
         self.start_pos = 1, 0
@@ -1239,14 +1633,26 @@ class PyFuzzyParser(object):
 
         code = code + '\n'  # end with \n, because the parser needs it
         buf = StringIO(code)
-        self._gen = common.NoErrorTokenizer(buf.readline, line_offset,
+        readline = buf.readline
+        if self.skeleton:
+            # the lines are the source of the skipped bodies
+            self._lines = []
+
+            def readline():
+                line = buf.readline()
+                self._lines.append(line)
+                return line
+        self._gen = common.NoErrorTokenizer(readline, line_offset,
                                                             stop_on_scope)
+        # the names and operators of this parser, see `next`
+        self._strings = {}
         self.top_module = top_module or self.module
-        try:
-            self._parse()
-        except common.MultiLevelStopIteration:
-            # sometimes StopIteration isn't catched. Just ignore it.
-            pass
+        with debug.span('parse', module_path):
+            try:
+                self._parse()
+            except common.MultiLevelStopIteration:
+                # sometimes StopIteration isn't catched. Just ignore it.
+                pass
 
         # clean up unused decorators
         for d in self._decorators:
@@ -1256,6 +1662,12 @@ class PyFuzzyParser(object):
 
         self.start_pos = self.module.start_pos
         self.module.end_pos = self.end_pos
+        # The tokenizer is not needed anymore and generators cannot be pickled
+        # (see `cache.ModulePickling`).
+        del self._gen
+        del self._strings
+        if self.skeleton:
+            del self._lines
 
     def __repr__(self):
         return "<%s: %s>" % (type(self).__name__, self.module)
@@ -1264,9 +1676,9 @@ class PyFuzzyParser(object):
         # this is not user checking, just update the used_names
         for tok_name in self.module.temp_used_names:
             try:
-                self.module.used_names[tok_name].add(simple)
+                self.module._used_names[tok_name].add(simple)
             except KeyError:
-                self.module.used_names[tok_name] = set([simple])
+                self.module._used_names[tok_name] = set([simple])
         self.module.temp_used_names = []
 
         if not self.user_position:
@@ -1317,7 +1729,7 @@ class PyFuzzyParser(object):
                 break
             append((tok, self.start_pos))
 
-        n = Name(self.module, names, first_pos, self.end_pos) if names \
+        n = Name(self.node_module, names, first_pos, self.end_pos) if names \
                                                                 else None
         return n, token_type, tok
 
@@ -1406,8 +1818,8 @@ class PyFuzzyParser(object):
         if token_type != tokenize.NAME:
             return None
 
-        fname = Name(self.module, [(fname, self.start_pos)], self.start_pos,
-                                                                self.end_pos)
+        fname = Name(self.node_module, [(fname, self.start_pos)],
+                                            self.start_pos, self.end_pos)
 
         token_type, open = self.next()
         if open != '(':
@@ -1429,12 +1841,70 @@ class PyFuzzyParser(object):
             return None
 
         # because of 2 line func param definitions
-        scope = Function(self.module, fname, params, first_pos, annotation)
+        scope = Function(self.node_module, fname, params, first_pos,
+                                                            annotation)
         if self.user_scope and scope != self.user_scope \
                         and self.user_position > first_pos:
             self.user_scope = scope
         return scope
 
+    def _skip_function_body(self, func):
+        """
+        Skips the body of `func` in a skeleton parse. Bodies in the line of the
+        `def` and syntax errors are parsed as usual.
+        """
+        token_type, tok = self.next()
+        if token_type not in [tokenize.NEWLINE, tokenize.COMMENT]:
+            self._gen.push_last_back()
+            return
+        while token_type in [tokenize.NEWLINE, tokenize.NL,
+                             tokenize.COMMENT]:
+            token_type, tok = self.next()
+        self._gen.push_last_back()
+        if token_type != tokenize.INDENT:
+            return
+
+        debug.increment('parsing.bodies_skipped')
+        self.freshscope = False
+        first_line = func._start_pos[0] - self._line_offset - 1
+        last_line = None
+        end_indent = ''
+        has_global = False
+        first = True
+        names = set()
+        try:
+            self.next()
+            while True:
+                token_type, tok = self.next()
+                if token_type == tokenize.NAME:
+                    names.add(tok)
+                if token_type == tokenize.DEDENT \
+                        and self.start_pos[1] <= func._start_pos[1]:
+                    # the body ends, the parser closes the scope
+                    self._gen.push_last_back()
+                    last_line = self.start_pos[0] - self._line_offset - 1
+                    line = ''.join(self._lines[last_line:last_line + 1])
+                    end_indent = line[:self.start_pos[1]]
+                    break
+                elif token_type == tokenize.STRING and first:
+                    string = tok
+                    token_type, tok = self.next()
+                    if token_type == tokenize.NEWLINE:
+                        func.add_docstr(string)
+                elif tok == 'global':
+                    # changes the module, therefore the body is needed
+                    has_global = True
+                if token_type not in [tokenize.NL, tokenize.COMMENT]:
+                    first = False
+        except StopIteration:
+            # the end of the code
+            pass
+        finally:
+            func.skip_body(''.join(self._lines[first_line:last_line]),
+                           end_indent, names)
+        if has_global:
+            func.parse_body()
+
     def _parseclass(self):
         """
         The parser for a text class. Process the tokens, which follow a
@@ -1450,8 +1920,8 @@ class PyFuzzyParser(object):
                 % (self.start_pos[0], tokenize.tok_name[token_type], cname))
             return None
 
-        cname = Name(self.module, [(cname, self.start_pos)], self.start_pos,
-                                                                self.end_pos)
+        cname = Name(self.node_module, [(cname, self.start_pos)],
+                                            self.start_pos, self.end_pos)
 
         super = []
         token_type, next = self.next()
@@ -1464,7 +1934,7 @@ class PyFuzzyParser(object):
             return None
 
         # because of 2 line class initializations
-        scope = Class(self.module, cname, super, first_pos)
+        scope = Class(self.node_module, cname, super, first_pos)
         if self.user_scope and scope != self.user_scope \
                         and self.user_position > first_pos:
             self.user_scope = scope
@@ -1547,7 +2017,7 @@ class PyFuzzyParser(object):
                     if tok != ':':
                         continue
 
-                    lambd = Lambda(self.module, params, start_pos)
+                    lambd = Lambda(self.node_module, params, start_pos)
                     ret, tok = self._parse_statement(added_breaks=[','])
                     if ret is not None:
                         ret.parent = lambd
@@ -1603,7 +2073,7 @@ class PyFuzzyParser(object):
                         for t in toks:
                             src += t[1] if isinstance(t, tuple) \
                                         else t.get_code()
-                        st = Statement(self.module, src, [], [], [],
+                        st = Statement(self.node_module, src, [], [], [],
                                         toks, first_pos, self.end_pos)
 
                         for s in [st, middle, in_clause]:
@@ -1653,7 +2123,7 @@ class PyFuzzyParser(object):
             self.scope.add_docstr(self.last_token[1])
             return None, tok
         else:
-            stmt = stmt_class(self.module, string, set_vars, used_funcs,
+            stmt = stmt_class(self.node_module, string, set_vars, used_funcs,
                             used_vars, tok_list, first_pos, self.end_pos)
 
             self._check_user_stmt(stmt)
@@ -1688,6 +2158,9 @@ class PyFuzzyParser(object):
                     (self.parserline.replace('\n', ''), repr(self.scope)))
             self.user_scope = self.scope
         self.last_token = self.current
+        if typ == tokenize.NAME or typ == tokenize.OP:
+            # equal names share one string (memory)
+            tok = self._strings.setdefault(tok, tok)
         self.current = (typ, tok)
         return self.current
 
@@ -1747,6 +2220,8 @@ class PyFuzzyParser(object):
                 self.freshscope = True
                 self.scope = self.scope.add_scope(func, self._decorators)
                 self._decorators = []
+                if self.skeleton:
+                    self._skip_function_body(func)
             elif tok == 'class':
                 cls = self._parseclass()
                 if cls is None:
@@ -1759,12 +2234,12 @@ class PyFuzzyParser(object):
             elif tok == 'import':
                 imports = self._parseimportlist()
                 for m, alias, defunct in imports:
-                    i = Import(self.module, first_pos, self.end_pos, m, alias,
-                                                        defunct=defunct)
+                    i = Import(self.node_module, first_pos, self.end_pos, m,
+                                                alias, defunct=defunct)
                     self._check_user_stmt(i)
                     self.scope.add_import(i)
                 if not imports:
-                    i = Import(self.module, first_pos, self.end_pos, None,
+                    i = Import(self.node_module, first_pos, self.end_pos, None,
                                                                 defunct=True)
                     self._check_user_stmt(i)
                 self.freshscope = False
@@ -1793,7 +2268,7 @@ class PyFuzzyParser(object):
                     star = name is not None and name.names[0] == '*'
                     if star:
                         name = None
-                    i = Import(self.module, first_pos, self.end_pos, name,
+                    i = Import(self.node_module, first_pos, self.end_pos, name,
                                         alias, mod, star, relative_count,
                                         defunct=defunct or defunct2)
                     self._check_user_stmt(i)
@@ -1806,7 +2281,7 @@ class PyFuzzyParser(object):
                     statement, tok = self._parse_statement()
                     if tok == ':':
                         s = [] if statement is None else [statement]
-                        f = ForFlow(self.module, s, first_pos, set_stmt)
+                        f = ForFlow(self.node_module, s, first_pos, set_stmt)
                         self.scope = self.scope.add_statement(f)
                     else:
                         debug.warning('syntax err, for flow started @%s',
@@ -1845,7 +2320,7 @@ class PyFuzzyParser(object):
                     first = False
 
                 if tok == ':':
-                    f = Flow(self.module, command, inits, first_pos)
+                    f = Flow(self.node_module, command, inits, first_pos)
                     if command in extended_flow:
                         # the last statement has to be another part of
                         # the flow statement, because a dedent releases the
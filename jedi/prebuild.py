@@ -0,0 +1,109 @@
+"""
+Writes the index of the standard library and of the packages in
+:data:`settings.prebuild_packages`, that is used with
+:data:`settings.use_stub_index`::
+
+    python -m jedi.prebuild [package ...]
+
+The modules are parsed (and compiled modules introspected) like on an import
+and stored in one file in :data:`settings.cache_directory`. A new process
+therefore only unpickles the modules it uses, e.g. the builtins for the first
+completion. The code of the modules isn't unpickled at all, it's read from the
+file (which is shared by all processes) when it's needed. Packages on the
+command line are added to the configured ones. Modules, that change later, are
+parsed again as usual, but the index should be written again after an update
+of Python or the packages.
+"""
+import sys
+import os
+import imp
+
+# `jedi/__init__.py` has already imported these modules with the jedi directory
+# in the `sys.path`, so they are found in `sys.modules` (Python 2 imports them
+# relative to the package anyway).
+import modules
+import builtin
+import cache
+import debug
+import imports
+import settings
+
+# packages of the standard library, that are big and not imported by normal
+# code
+skipped_modules = set(['test', 'idlelib', 'turtledemo', 'lib2to3'])
+
+
+def stdlib_modules():
+    """ Returns the names of the (top level) modules of the standard library.
+    """
+    names = set(sys.builtin_module_names)
+    lib = os.path.dirname(os.__file__)
+    for directory in [lib, os.path.join(lib, 'lib-dynload')]:
+        names.update(imports._module_names(directory))
+    return sorted(names - skipped_modules)
+
+
+def find_modules(name):
+    """
+    Generates the `builtin.CachedModule` objects of the module `name` and of
+    its submodules, if it is a package.
+    """
+    path = None
+    try:
+        for part in name.split('.'):
+            if path is None:
+                result = imports.find_module(part, builtin.get_sys_path(),
+                                             builtins=True)
+            else:
+                result = imports.find_module(part, [path])
+            path = result[1]
+    except ImportError:
+        debug.warning('prebuild: module %s not found' % name)
+        return
+
+    module_type = result[2][2]
+    yield imports.get_cached_module(path, module_type)
+    if module_type == imp.PKG_DIRECTORY:
+        for sub_name in imports._module_names(path):
+            if sub_name not in skipped_modules:
+                for module in find_modules(name + '.' + sub_name):
+                    yield module
+
+
+def generate_entries(names):
+    """
+    Generates the entries of `cache.StubIndex.write`. The bodies of the
+    functions are always skipped (see :data:`settings.lazy_function_bodies`),
+    their code is read from the index when it's needed.
+    """
+    for name in names:
+        for module in find_modules(name):
+            old = settings.lazy_function_bodies
+            settings.lazy_function_bodies = True
+            try:
+                if isinstance(module, modules.Module):
+                    key = module.path
+                    header = cache.module_pickling.get_header(module.path,
+                                                              module.source)
+                else:
+                    key, header = module._get_source_key(), None
+                parser = module.parser
+            except Exception:
+                # Broken modules (e.g. compiled ones, that cannot be
+                # imported) are just left out.
+                debug.warning('prebuild: %s failed: %s'
+                              % (name, sys.exc_info()[1]))
+                continue
+            finally:
+                settings.lazy_function_bodies = old
+            yield key, header, parser
+
+
+def main(args):
+    names = stdlib_modules() + list(settings.prebuild_packages) + args
+    count = cache.stub_index.write(generate_entries(names))
+    print('%s modules written to %s' % (count, cache.stub_index.get_path()))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,231 @@
+"""
+A long running |jedi| process for editors, that talks JSON-RPC on stdin and
+stdout. Start it with::
+
+    python -m jedi.server
+
+Starting Python and importing |jedi| for every request is slow. The server
+keeps all parsed modules (and the generated code of builtins) in memory
+between requests.
+
+Messages are framed like in the language server protocol: A
+``Content-Length`` header, an empty line and the JSON body. Open buffers are
+sent with the ``didOpen``/``didChange`` notifications (always the full text)
+and removed with ``didClose``. The requests ``complete``, ``goto``,
+``get_definition``, ``related_names`` and ``get_in_function_call`` take the
+params ``path``, ``line`` and ``column`` (and optionally ``source``, if the
+buffer hasn't been opened)::
+
+    {"jsonrpc": "2.0", "id": 1, "method": "complete",
+     "params": {"path": "/tmp/a.py", "line": 1, "column": 19}}
+
+Open buffers are never removed from the module cache. ``cacheInfo`` returns
+its size and statistics (see :func:`api.get_cache_info`).
+"""
+import sys
+import os
+try:
+    import json
+except ImportError:
+    # Python 2.5
+    import simplejson as json
+
+# Importing `jedi.server` doesn't add the jedi directory to the `sys.path`
+# (see `jedi/__init__.py`).
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import api
+import debug
+from _compatibility import unicode
+sys.path.pop(0)
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+NOT_FOUND = -32000
+
+
+class ServerError(Exception):
+    def __init__(self, code, message):
+        super(ServerError, self).__init__(message)
+        self.code = code
+
+
+def _definition_to_dict(d):
+    return {
+        'description': unicode(d.description),
+        'module_path': d.module_path,
+        'line': d.line,
+        'column': d.column,
+        'doc': unicode(d.doc),
+        'type': d.type,
+    }
+
+
+def _completion_to_dict(c):
+    dct = _definition_to_dict(c)
+    dct.update(word=unicode(c.word), complete=unicode(c.complete))
+    return dct
+
+
+def _call_def_to_dict(call_def):
+    if call_def is None:
+        return None
+    return {
+        'call_name': call_def.call_name,
+        'index': call_def.index,
+        'params': [unicode(p.get_code().strip()) for p in call_def.params],
+        'bracket_start': call_def.bracket_start,
+    }
+
+
+class Server(object):
+    """
+    Handles the JSON-RPC messages. :meth:`handle` can be used without any
+    streams, :meth:`serve` reads messages from `stdin` until it is closed.
+    """
+    def __init__(self, stdin=None, stdout=None):
+        if stdin is None:
+            stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+        if stdout is None:
+            stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+        self.stdin = stdin
+        self.stdout = stdout
+        self.documents = {}
+
+    def serve(self):
+        while True:
+            message = self.read_message()
+            if message is None:
+                break
+            response = self.handle(message)
+            if response is not None:
+                self.write_message(response)
+
+    def read_message(self):
+        """ Returns the body of the next message or None at the end. """
+        length = None
+        while True:
+            line = self.stdin.readline()
+            if not line:
+                return None
+            line = line.decode('ascii').strip()
+            if not line:
+                if length is not None:
+                    break
+                continue
+            key, _, value = line.partition(':')
+            if key.strip().lower() == 'content-length':
+                length = int(value)
+        return self.stdin.read(length).decode('utf-8')
+
+    def write_message(self, message):
+        body = json.dumps(message).encode('utf-8')
+        self.stdout.write(('Content-Length: %s\r\n\r\n' % len(body))
+                                                        .encode('ascii'))
+        self.stdout.write(body)
+        self.stdout.flush()
+
+    def handle(self, body):
+        """
+        Handles a message (a JSON string) and returns the response as a dict
+        or None, if the message is a notification.
+        """
+        try:
+            message = json.loads(body)
+        except ValueError:
+            return self._error(None, PARSE_ERROR, 'Parse error')
+        if not isinstance(message, dict) \
+                or not isinstance(message.get('method'), (str, unicode)):
+            return self._error(message, INVALID_REQUEST, 'Invalid Request')
+
+        method = message['method']
+        params = message.get('params')
+        if params is None:
+            params = {}
+        elif not isinstance(params, dict):
+            return self._error(message, INVALID_PARAMS,
+                               'Params must be an object')
+        try:
+            func = getattr(self, '_rpc_' + method)
+        except AttributeError:
+            return self._error(message, METHOD_NOT_FOUND,
+                               'Method not found: %s' % method)
+        try:
+            result = func(**params)
+        except ServerError:
+            e = sys.exc_info()[1]
+            return self._error(message, e.code, unicode(e))
+        except api.NotFoundError:
+            return self._error(message, NOT_FOUND, 'Not found')
+        except Exception:
+            e, tb = sys.exc_info()[1:]
+            if isinstance(e, TypeError) and tb.tb_next is None:
+                # raised by the call itself: wrong or missing params
+                return self._error(message, INVALID_PARAMS, unicode(e))
+            debug.warning('server error', method, e)
+            return self._error(message, INTERNAL_ERROR, repr(e))
+
+        if 'id' not in message:
+            return None
+        return {'jsonrpc': '2.0', 'id': message['id'], 'result': result}
+
+    def _error(self, message, code, text):
+        if isinstance(message, dict) and 'id' not in message:
+            return None
+        return {
+            'jsonrpc': '2.0',
+            'id': message.get('id') if isinstance(message, dict) else None,
+            'error': {'code': code, 'message': text},
+        }
+
+    def _script(self, path, line, column, source=None):
+        if source is None:
+            try:
+                source = self.documents[path]
+            except KeyError:
+                raise ServerError(INVALID_PARAMS, 'Unknown document: %s'
+                                                                    % path)
+        return api.Script(source, line, column, path)
+
+    def _rpc_didOpen(self, path, source):
+        self.documents[path] = source
+        api.pin_module(path)
+
+    _rpc_didChange = _rpc_didOpen
+
+    def _rpc_didClose(self, path):
+        self.documents.pop(path, None)
+        api.unpin_module(path)
+
+    def _rpc_cacheInfo(self):
+        return api.get_cache_info()
+
+    def _rpc_complete(self, path, line, column, source=None):
+        script = self._script(path, line, column, source)
+        return [_completion_to_dict(c) for c in script.complete()]
+
+    def _rpc_goto(self, path, line, column, source=None):
+        script = self._script(path, line, column, source)
+        return [_definition_to_dict(d) for d in script.goto()]
+
+    def _rpc_get_definition(self, path, line, column, source=None):
+        script = self._script(path, line, column, source)
+        return [_definition_to_dict(d) for d in script.get_definition()]
+
+    def _rpc_related_names(self, path, line, column, source=None):
+        script = self._script(path, line, column, source)
+        return [_definition_to_dict(d) for d in script.related_names()]
+
+    def _rpc_get_in_function_call(self, path, line, column, source=None):
+        script = self._script(path, line, column, source)
+        return _call_def_to_dict(script.get_in_function_call())
+
+
+def main():
+    Server().serve()
+
+
+if __name__ == '__main__':
+    main()
@@ -27,6 +27,8 @@ Parser
 
 .. autodata:: fast_parser
 .. autodata:: fast_parser_always_reparse
+.. autodata:: lazy_function_bodies
+.. autodata:: fast_tokenizer
 .. autodata:: use_get_in_function_call_cache
 
 
@@ -65,6 +67,23 @@ Caching
 
 .. autodata:: star_import_cache_validity
 .. autodata:: get_in_function_call_validity
+.. autodata:: use_filesystem_cache
+.. autodata:: cache_directory
+.. autodata:: use_stub_index
+.. autodata:: prebuild_packages
+.. autodata:: module_cache_memory
+
+
+Introspection
+~~~~~~~~~~~~~
+
+Compiled modules (builtins, C extensions) cannot be parsed, |jedi| imports
+them and generates Python source from them. Imported modules stay in memory
+and slow imports block the completion.
+
+.. autodata:: introspection_in_subprocess
+.. autodata:: introspection_processes
+.. autodata:: introspection_timeout
 
 
 Various
@@ -74,6 +93,7 @@ Various
 
 
 """
+import os
 
 # ----------------
 # completion output settings
@@ -120,6 +140,20 @@ This is just a debugging option. Always reparsing means that the fast parser
 is basically useless. So don't use it.
 """
 
+lazy_function_bodies = False
+"""
+Imported modules are parsed without the bodies of their functions. A body is
+parsed when it's needed, e.g. for the return types of the function. This makes
+the first completion on big modules faster, but the bodies that are needed
+later are tokenized twice.
+"""
+
+fast_tokenizer = True
+"""
+Use :mod:`tokenizer` instead of the standard library's :mod:`tokenize` for
+parsing. It's faster and tolerates wrong indentation.
+"""
+
 use_get_in_function_call_cache = True
 """
 Use the cache (full cache) to generate get_in_function_call's. This may fail
@@ -222,3 +256,68 @@ get_in_function_call_validity = 3.0
 Finding function calls might be slow (0.1-0.5s). This is not acceptible for
 normal writing. Therefore cache it for a short time.
 """
+
+# ----------------
+# filesystem cache
+# ----------------
+
+use_filesystem_cache = False
+"""
+Parsing the standard library and big packages takes a lot of time on every
+start of the editor. With this option, parsed modules are pickled to
+:data:`cache_directory` and loaded from there, if the source hasn't changed.
+The index of the names used in each directory (for the dynamic search of
+params and related names) is stored there as well.
+"""
+
+cache_directory = os.path.expanduser(os.path.join('~', '.jedi'))
+"""
+The path where all the caches can be found. Every |jedi| version and every
+Python version uses its own sub directory.
+"""
+
+use_stub_index = True
+"""
+Load modules from the index in :data:`cache_directory`, that is written by
+``python -m jedi.prebuild`` (see :mod:`prebuild`), instead of parsing or
+introspecting them. Modules, that are not in the index or have changed, are
+parsed as usual.
+"""
+
+prebuild_packages = []
+"""
+The packages (e.g. ``['numpy', 'django']``), that ``python -m jedi.prebuild``
+adds to the index besides the standard library.
+"""
+
+# ----------------
+# module cache
+# ----------------
+
+module_cache_memory = 300
+"""
+The approximate memory (in megabytes), that parsed modules may use. If they
+need more, the least recently used modules are removed from the cache (but
+never the open buffers). ``None`` means no limit.
+"""
+
+# ----------------
+# introspection
+# ----------------
+
+introspection_in_subprocess = False
+"""
+Import compiled modules in separate worker processes instead of the editor's
+process. Only the generated source is sent back.
+"""
+
+introspection_processes = 2
+"""
+The maximum number of introspection worker processes.
+"""
+
+introspection_timeout = 10.0
+"""
+Seconds to wait for an introspection worker. If a module takes longer to
+import, the worker is killed and the module is treated as empty.
+"""
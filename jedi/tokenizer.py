@@ -0,0 +1,222 @@
+"""
+A faster variant of :func:`tokenize.generate_tokens` for the parser (see
+:data:`settings.fast_tokenizer`). The tokens are the same for valid code, but:
+
+- The positions contain the line offset already and the position of a token,
+  that starts where the last one ended, is the same object (memory).
+- Inconsistent dedents don't raise an `IndentationError`, the line is just
+  indented as far as possible.
+
+Like in :mod:`tokenize` the tokens end without an error, if a bracket or a
+multi-line string is not closed at the end of the code.
+"""
+import re
+import tokenize
+from tokenize import NAME, NUMBER, STRING, OP, COMMENT, NEWLINE, NL, \
+    INDENT, DEDENT, ENDMARKER, ERRORTOKEN
+
+_pseudo = re.compile(tokenize.PseudoToken)
+try:
+    # Python 2
+    _endprogs = tokenize.endprogs
+except AttributeError:
+    _endprogs = dict((k, re.compile(v)) for k, v in tokenize.endpats.items()
+                     if v is not None)
+_triple_quoted = tokenize.triple_quoted
+_tabsize = tokenize.tabsize
+
+# The kinds of tokens by their first character, others are names (letters) or
+# operators.
+_NAME, _STRING, _BACKSLASH = 'name', 'string', 'backslash'
+_kinds = {'#': COMMENT, '\n': NEWLINE, '\r': NEWLINE, '.': NUMBER,
+          '\\': _BACKSLASH, '"': _STRING, "'": _STRING, '_': _NAME}
+for _char in '0123456789':
+    _kinds[_char] = NUMBER
+for _char in 'abcdefghijklmnopqrstuvwxyz':
+    _kinds[_char] = _kinds[_char.upper()] = _NAME
+for _char in '()[]{}:,;+-*/%&|^~<>=!@':
+    _kinds[_char] = OP
+# names with a quote at the end are strings with a prefix (``r''``)
+_string_ends = '\'"\n'
+
+
+def generate_tokens(readline, line_offset=0):
+    """
+    Generates the tokens of the lines returned by `readline` as tuples
+    ``(type, string, start, end, line)``.
+    """
+    lnum = line_offset
+    parenlev = 0
+    continued = False
+    indents = [0]
+    contstr = None
+    last_line = ''
+    line = ''
+    pseudo_match = _pseudo.match
+    while True:
+        last_line = line
+        line = readline()
+        lnum += 1
+        pos = 0
+        length = len(line)
+
+        if contstr is not None:
+            # a string of several lines
+            if not line:
+                return
+            endmatch = endprog.match(line)
+            if endmatch:
+                pos = end = endmatch.end(0)
+                yield (STRING, contstr + line[:end], strstart, (lnum, end),
+                       contline + line)
+                contstr = None
+            elif needcont and line[-2:] != '\\\n' and line[-3:] != '\\\r\n':
+                yield (ERRORTOKEN, contstr + line, strstart,
+                       (lnum, length), contline)
+                contstr = None
+                continue
+            else:
+                contstr += line
+                contline += line
+                continue
+        elif parenlev == 0 and not continued:
+            # a new statement
+            if not line:
+                break
+            stripped = line.lstrip(' \t\f')
+            pos = length - len(stripped)
+            if not stripped:
+                break
+            indentation = line[:pos]
+            if '\t' in indentation or '\f' in indentation:
+                column = 0
+                for char in indentation:
+                    if char == ' ':
+                        column += 1
+                    elif char == '\t':
+                        column = (column // _tabsize + 1) * _tabsize
+                    else:
+                        column = 0
+            else:
+                column = pos
+
+            initial = stripped[0]
+            if initial == '#' or initial == '\r' or initial == '\n':
+                # comments and blank lines
+                if initial == '#':
+                    comment = stripped.rstrip('\r\n')
+                    end = pos + len(comment)
+                    yield (COMMENT, comment, (lnum, pos), (lnum, end), line)
+                    pos = end
+                yield (NL, line[pos:], (lnum, pos), (lnum, length), line)
+                continue
+
+            if column > indents[-1]:
+                indents.append(column)
+                yield (INDENT, indentation, (lnum, 0), (lnum, pos), line)
+            if column < indents[-1]:
+                dedent_pos = lnum, pos
+                while column < indents[-1]:
+                    indents.pop()
+                    yield (DEDENT, '', dedent_pos, dedent_pos, line)
+                if column > indents[-1]:
+                    # not an indentation level of the block, tokenize raises
+                    # an IndentationError
+                    indents.append(column)
+                    yield (INDENT, indentation, (lnum, 0), dedent_pos, line)
+        else:
+            # a continued statement
+            if not line:
+                return
+            continued = False
+
+        last_end = -1
+        epos = None
+        while pos < length:
+            match = pseudo_match(line, pos)
+            if match is None:
+                yield (ERRORTOKEN, line[pos], (lnum, pos), (lnum, pos + 1),
+                       line)
+                pos += 1
+                continue
+            start, pos = match.span(1)
+            if start == pos:
+                continue
+            if start == last_end:
+                spos = epos
+            else:
+                spos = lnum, start
+            epos = lnum, pos
+            last_end = pos
+            token = line[start:pos]
+            initial = token[0]
+            kind = _kinds.get(initial)
+            if kind is None:
+                kind = _NAME if initial.isalpha() else OP
+
+            if kind == _NAME:
+                if token[-1] not in _string_ends:
+                    yield (NAME, token, spos, epos, line)
+                    continue
+                kind = _STRING  # with a prefix
+            elif kind == OP:
+                if initial in '([{':
+                    parenlev += 1
+                elif initial in ')]}':
+                    parenlev -= 1
+                yield (OP, token, spos, epos, line)
+                continue
+            elif kind == NUMBER:
+                if initial == '.' and (token == '.' or token == '...'):
+                    yield (OP, token, spos, epos, line)
+                else:
+                    yield (NUMBER, token, spos, epos, line)
+                continue
+            elif kind == NEWLINE:
+                yield (NL if parenlev > 0 else NEWLINE, token, spos, epos,
+                       line)
+                continue
+            elif kind == COMMENT:
+                yield (COMMENT, token, spos, epos, line)
+                continue
+            elif kind == _BACKSLASH:
+                continued = True
+                continue
+
+            # strings
+            if token in _triple_quoted:
+                endprog = _endprogs[token]
+                endmatch = endprog.match(line, pos)
+                if endmatch:
+                    # in one line
+                    pos = endmatch.end(0)
+                    epos = lnum, pos
+                    last_end = pos
+                    yield (STRING, line[start:pos], spos, epos, line)
+                else:
+                    strstart = spos
+                    contstr = line[start:]
+                    contline = line
+                    needcont = False
+                    break
+            elif token[-1] == '\n':
+                # continued with a backslash
+                strstart = spos
+                endprog = _endprogs.get(initial) \
+                    or _endprogs.get(token[1]) or _endprogs.get(token[2])
+                contstr = line[start:]
+                contline = line
+                needcont = True
+                break
+            else:
+                yield (STRING, token, spos, epos, line)
+
+    if last_line and last_line[-1] not in '\r\n' \
+            and not last_line.strip().startswith('#'):
+        # an implicit NEWLINE like in Python 3
+        yield (NEWLINE, '', (lnum - 1, len(last_line)),
+               (lnum - 1, len(last_line) + 1), '')
+    end = lnum, 0
+    for indent in indents[1:]:
+        yield (DEDENT, '', end, end, '')
+    yield (ENDMARKER, '', end, end, '')
@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+"""
+Measures the speed of |jedi| with the cases of the completion tests (the
+comments ``#?``, ``#!`` and ``#<`` in ``test/completion``) and optionally the
+tests of ``regression.py``. The results are not checked, use ``run.py`` for
+that.
+
+Every case is run with empty caches (``--cold``) and/or after it has been run
+once (``--warm``, the state of an editor that is already running). The time of
+a case is split into parsing the buffer and evaluating (everything else,
+including the parsing of imported modules).
+
+Usage::
+
+    python benchmark.py [file [line ...] ...] [--thirdparty] [--regression]
+                        [--cold | --warm] [--repeat N]
+                        [--save FILE] [--compare FILE] [--tolerance 0.2]
+    python benchmark.py --tokenizer [--repeat N]
+
+``--save`` writes the results as JSON. ``--compare`` compares the results with
+such a file. The exit code is 1, if a percentile is slower than the baseline by
+more than ``--tolerance`` (a fraction).
+
+``--tokenizer`` measures the tokens per second of the parser's tokenizer for
+the modules of the standard library, with :mod:`tokenize` and with the faster
+:mod:`tokenizer` (see ``settings.fast_tokenizer``).
+"""
+import os
+import sys
+import re
+import time
+import unittest
+from os.path import abspath, dirname
+try:
+    import json
+except ImportError:
+    # Python 2.5
+    import simplejson as json
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+sys.path.insert(0, abspath(dirname(abspath(__file__)) + '/../jedi'))
+os.chdir(dirname(abspath(__file__)) + '/../jedi')
+
+from _compatibility import unicode, StringIO
+
+import api
+import common
+import settings
+
+sys.path.pop(0)  # pop again, because it might affect the completion
+
+PERCENTILES = [50, 90, 99]
+
+
+def clear_all_caches():
+    """ Forget everything, like a new process. """
+    api.builtin.CachedModule.cache.clear()
+    api.builtin.fast_parser.parser_cache.clear()
+    api.cache.star_import_cache.clear()
+    api.imports._directory_cache.clear()
+    api.imports._resolution_cache.clear()
+    api.imports._module_names_cache.clear()
+    api.cache.clear_caches(delete_all=True)
+
+
+def peak_memory():
+    """ The maximum resident set size of this process (KB on Linux). """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure_tokenizer(paths, repeat):
+    """
+    Returns the tokens per second of `common.NoErrorTokenizer` with
+    :mod:`tokenize` and with :mod:`tokenizer` as a dict.
+    """
+    sources = []
+    for path in paths:
+        f = open(path)
+        try:
+            try:
+                sources.append(f.read())
+            except UnicodeDecodeError:
+                pass
+        finally:
+            f.close()
+
+    result = {}
+    old = settings.fast_tokenizer
+    try:
+        for name, fast in [('tokenize', False), ('fast', True)]:
+            settings.fast_tokenizer = fast
+            times = []
+            for i in range(repeat):
+                count = 0
+                start = time.time()
+                for source in sources:
+                    tokenizer = common.NoErrorTokenizer(
+                                                StringIO(source).readline)
+                    try:
+                        while True:
+                            next(tokenizer)
+                            count += 1
+                    except StopIteration:
+                        pass
+                times.append(time.time() - start)
+            result[name] = count / min(times)
+    finally:
+        settings.fast_tokenizer = old
+    return result
+
+
+def percentile(values, p):
+    """ The nearest-rank percentile of `values`. """
+    values = sorted(values)
+    if not values:
+        return None
+    index = int(round(p / 100.0 * len(values) + 0.5)) - 1
+    return values[max(0, min(index, len(values) - 1))]
+
+
+def median(values):
+    return percentile(values, 50)
+
+
+def collect_cases(completion_test_dir, test_files, thirdparty=False):
+    """
+    Returns the cases of the completion tests as tuples
+    ``(name, source, line, column, path, method)``.
+    """
+    cases = []
+    for f_name in sorted(os.listdir(completion_test_dir)):
+        if not f_name.endswith('.py') or f_name == '__init__.py':
+            continue
+        files = [f for f in test_files if f in f_name]
+        if test_files and not files:
+            continue
+        lines_to_execute = []
+        for f in files:
+            lines_to_execute += test_files[f]
+        if thirdparty:
+            try:
+                __import__(f_name.replace('_.py', ''))
+            except ImportError:
+                continue
+
+        path = os.path.join(completion_test_dir, f_name)
+        f = open(path)
+        try:
+            source = f.read()
+        finally:
+            f.close()
+        lines = source.splitlines()
+        for i, line in enumerate(lines[:-1]):
+            r = re.search(r'(?:^|(?<=\s))#([?!<])\s*([^\n]+)', line)
+            if r is None:
+                continue
+            if lines_to_execute and i + 1 not in lines_to_execute:
+                continue
+            test_type, correct = r.groups()
+            line_nr = i + 2  # the line after the comment
+            index = re.match(r'^(\d+)\s', correct)
+            if index:
+                column = int(index.group(1))
+                correct = correct[index.end():]
+            else:
+                column = len(lines[i + 1])
+            if test_type == '!':
+                method = 'goto'
+            elif test_type == '<':
+                method = 'related_names'
+            elif correct.startswith('['):
+                method = 'complete'
+            else:
+                method = 'get_definition'
+            name = '%s:%s' % (f_name, line_nr)
+            cases.append((name, source, line_nr, column, path, method))
+    return cases
+
+
+def run_case(source, line, column, path, method):
+    """ Returns the time of parsing and of evaluating. """
+    start = time.time()
+    script = api.Script(source, line, column, path)
+    script._parser
+    parsed = time.time()
+    try:
+        getattr(script, method)()
+    except Exception:
+        # e.g. NotFoundError, the result doesn't matter here.
+        pass
+    return parsed - start, time.time() - parsed
+
+
+def run_regression_test(test):
+    start = time.time()
+    test.run(unittest.TestResult())
+    return 0.0, time.time() - start
+
+
+def measure(cases, mode, repeat):
+    """
+    Runs all cases `repeat` times and returns a dict ``name -> (total, parse,
+    evaluate)`` with the medians.
+    """
+    results = {}
+    for name, func, args in cases:
+        if mode == 'warm':
+            func(*args)
+        samples = []
+        for i in range(repeat):
+            if mode == 'cold':
+                clear_all_caches()
+            samples.append(func(*args))
+        parse = median([s[0] for s in samples])
+        evaluate = median([s[1] for s in samples])
+        results[name] = median([s[0] + s[1] for s in samples]), parse, \
+                                                                evaluate
+    return results
+
+
+def summarize(results):
+    totals = [r[0] for r in results.values()]
+    summary = {'cases': len(totals), 'sum': sum(totals),
+               'parse': sum([r[1] for r in results.values()]),
+               'evaluate': sum([r[2] for r in results.values()])}
+    for p in PERCENTILES:
+        summary['p%s' % p] = percentile(totals, p)
+    summary['max'] = max(totals) if totals else None
+    return summary
+
+
+def print_summary(mode, summary):
+    ms = lambda seconds: '%.1fms' % (seconds * 1000) if seconds is not None \
+                                                        else '-'
+    print('%s: %s cases in %.3fs (parse %.3fs, evaluate %.3fs)'
+          % (mode, summary['cases'], summary['sum'], summary['parse'],
+             summary['evaluate']))
+    print('    ' + ', '.join(['p%s %s' % (p, ms(summary['p%s' % p]))
+                              for p in PERCENTILES])
+          + ', max %s' % ms(summary['max']))
+    if summary['peak_memory'] is not None:
+        print('    peak memory %s KB' % summary['peak_memory'])
+
+
+def compare(report, baseline, tolerance):
+    """ Prints the differences and returns True if something got slower. """
+    slower = False
+    for mode, data in report['modes'].items():
+        try:
+            old = baseline['modes'][mode]
+        except KeyError:
+            print('%s: not in the baseline' % mode)
+            continue
+        for key in ['p%s' % p for p in PERCENTILES] + ['parse', 'evaluate']:
+            new_value, old_value = data['summary'][key], old['summary'][key]
+            if not old_value or new_value is None:
+                continue
+            ratio = new_value / old_value
+            flag = ''
+            if ratio > 1 + tolerance:
+                flag = '  <- slower'
+                slower = True
+            print('%s %s: %.1fms -> %.1fms (%+.0f%%)%s'
+                  % (mode, key, old_value * 1000, new_value * 1000,
+                     (ratio - 1) * 100, flag))
+
+        # single cases, ignore differences below one millisecond (noise)
+        for name, (total, parse, evaluate) in sorted(data['cases'].items()):
+            try:
+                old_total = old['cases'][name][0]
+            except KeyError:
+                continue
+            if total > old_total * (1 + tolerance) and \
+                    total - old_total > 0.001:
+                print('    %s: %.1fms -> %.1fms'
+                      % (name, old_total * 1000, total * 1000))
+    return slower
+
+
+def main(args):
+    def pop_option(name, has_value=False):
+        try:
+            i = args.index(name)
+        except ValueError:
+            return None
+        value = args[i + 1] if has_value else True
+        del args[i:i + 1 + bool(has_value)]
+        return value
+
+    if pop_option('--tokenizer'):
+        repeat = int(pop_option('--repeat', True) or 3)
+        lib = dirname(os.__file__)
+        paths = [os.path.join(lib, f) for f in sorted(os.listdir(lib))
+                 if f.endswith('.py')]
+        result = measure_tokenizer(paths, repeat)
+        print('tokenizer: tokenize %.0f tokens/s, fast %.0f tokens/s (%.2fx)'
+              % (result['tokenize'], result['fast'],
+                 result['fast'] / result['tokenize']))
+        return 0
+
+    thirdparty = pop_option('--thirdparty')
+    regression = pop_option('--regression')
+    modes = ['cold', 'warm']
+    if pop_option('--cold'):
+        modes = ['cold']
+    if pop_option('--warm'):
+        modes = ['warm']
+    repeat = int(pop_option('--repeat', True) or 3)
+    save = pop_option('--save', True)
+    baseline = pop_option('--compare', True)
+    tolerance = float(pop_option('--tolerance', True) or 0.2)
+
+    # get test list, that should be executed (like run.py)
+    test_files = {}
+    last = None
+    for arg in args:
+        if arg.isdigit():
+            if last is not None:
+                test_files[last].append(int(arg))
+        else:
+            test_files[arg] = []
+            last = arg
+
+    completion_test_dir = '../test/completion'
+    cases = collect_cases(completion_test_dir, test_files)
+    if thirdparty:
+        cases += collect_cases(completion_test_dir + '/thirdparty',
+                               test_files, thirdparty=True)
+    cases = [(c[0], run_case, c[1:]) for c in cases]
+    if regression:
+        sys.path.insert(0, abspath(dirname(abspath(__file__))))
+        import regression as regression_module
+        sys.path.pop(0)
+        suite = unittest.TestLoader().loadTestsFromModule(regression_module)
+        stack = [suite]
+        while stack:
+            for test in stack.pop():
+                if isinstance(test, unittest.TestSuite):
+                    stack.append(test)
+                else:
+                    cases.append(('regression:' + test.id().split('.', 1)[1],
+                                  run_regression_test, (test,)))
+
+    report = {'python': '%s.%s.%s' % sys.version_info[:3], 'repeat': repeat,
+              'modes': {}}
+    for mode in modes:
+        results = measure(cases, mode, repeat)
+        summary = summarize(results)
+        summary['peak_memory'] = peak_memory()
+        print_summary(mode, summary)
+        report['modes'][mode] = {'summary': summary, 'cases': results}
+
+    if save:
+        f = open(save, 'w')
+        try:
+            json.dump(report, f, indent=1, sort_keys=True)
+        finally:
+            f.close()
+    if baseline:
+        f = open(baseline)
+        try:
+            baseline = json.load(f)
+        finally:
+            f.close()
+        if compare(report, baseline, tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+from __future__ import with_statement
+
 import os
 import sys
 import unittest
@@ -7,12 +9,19 @@ from os.path import abspath, dirname
 import time
 import functools
 import itertools
+import shutil
+import tempfile
+import threading
+import inspect
 
 sys.path.insert(0, abspath(dirname(abspath(__file__)) + '/../jedi'))
 os.chdir(os.path.dirname(os.path.abspath(__file__)) + '/../jedi')
 
-from _compatibility import is_py25, utf8, unicode
+from _compatibility import is_py25, utf8, unicode, pickle
 import api
+import async_api
+import server
+import prebuild
 
 #api.set_debug_function(api.debug.print_to_stdout)
 
@@ -316,6 +325,726 @@ class TestRegression(Base):
         assert c[0].word == 'IndentationError'
         self.assertEqual(c[0].complete, 'or')
 
+    def test_filesystem_cache(self):
+        """ Parsed modules are pickled and loaded again, if not changed. """
+        settings = api.settings
+        old = settings.use_filesystem_cache, settings.cache_directory
+        settings.use_filesystem_cache = True
+        settings.cache_directory = tempfile.mkdtemp()
+        try:
+            s = "import json.decoder; json.decoder.JSONDecod"
+            words = [c.word for c in self.complete(s)]
+            assert 'JSONDecoder' in words
+            # forget everything, the cache on the disk is still there
+            api.builtin.CachedModule.cache.clear()
+            api.builtin.fast_parser.parser_cache.clear()
+            assert [c.word for c in self.complete(s)] == words
+
+            import json.decoder
+            path = os.path.abspath(inspect.getsourcefile(json.decoder))
+            with open(path) as f:
+                source = f.read()
+            pickling = api.cache.module_pickling
+            assert pickling.load_module(path, source) is not None
+            assert pickling.load_module(path, source + '\n') is None
+        finally:
+            shutil.rmtree(settings.cache_directory)
+            settings.use_filesystem_cache, settings.cache_directory = old
+
+    def test_stub_index(self):
+        settings = api.settings
+        old = settings.cache_directory
+        settings.cache_directory = tempfile.mkdtemp()
+        try:
+            s = "import json.decoder; json.decoder.JSONDecod"
+            words = [c.word for c in self.complete(s)]
+            count = api.cache.stub_index.write(
+                        prebuild.generate_entries(['json', 'math']))
+            self.assertTrue(count >= 6)
+            api.builtin.CachedModule.cache.clear()
+            api.builtin.fast_parser.parser_cache.clear()
+            self.assertEqual([c.word for c in self.complete(s)], words)
+
+            import json.decoder
+            path = os.path.abspath(inspect.getsourcefile(json.decoder))
+            with open(path) as f:
+                source = f.read()
+            index = api.cache.stub_index
+            self.assertTrue(index.load_module(path, source) is not None)
+            self.assertTrue(index.load_module(path, source + '\n') is None)
+            key = list(prebuild.find_modules('math'))[0]._get_source_key()
+            parser = index.load_builtin(key)
+            self.assertTrue('sqrt' in [str(n) for n in
+                                       parser.module.get_defined_names()])
+            settings.use_stub_index = False
+            self.assertTrue(index.load_builtin(key) is None)
+        finally:
+            settings.use_stub_index = True
+            shutil.rmtree(settings.cache_directory)
+            settings.cache_directory = old
+
+    def test_stub_index_texts(self):
+        """ The code of the modules is read from the index, if it's used. """
+        settings = api.settings
+        old = settings.cache_directory
+        settings.cache_directory = tempfile.mkdtemp()
+        try:
+            index = api.cache.stub_index
+            # the bodies of modules, that are parsed already, aren't skipped
+            api.builtin.CachedModule.cache.clear()
+            api.builtin.fast_parser.parser_cache.clear()
+            index.write(prebuild.generate_entries(['json.decoder']))
+            import json.decoder
+            path = os.path.abspath(inspect.getsourcefile(json.decoder))
+            with open(path) as f:
+                source = f.read()
+            parser = index.load_module(path, source)
+            texts = [p.code for p in parser.parsers]
+            assert [t for t in texts if isinstance(t, api.cache.MappedText)]
+            self.assertEqual(''.join(api.cache.get_text(t) for t in texts)
+                             + parser._tail, source)
+
+            func = [f for f in parser.module.subscopes
+                    if str(f.name) == 'py_scanstring'][0]
+            body, end_indent = func.__dict__['_lazy_body']
+            assert isinstance(body, api.cache.MappedText)
+            assert len(func.returns) == 1
+            assert pickle.loads(pickle.dumps(body)) == body.decode()
+
+            parser.update(source + '\nfoo = 3\n')
+            names = [str(n) for n in parser.module.get_defined_names()]
+            assert 'foo' in names and 'JSONDecoder' in names
+        finally:
+            shutil.rmtree(settings.cache_directory)
+            settings.cache_directory = old
+
+    def test_filesystem_cache_builtin_source(self):
+        """ Compiled modules are not imported, if their source is cached. """
+        settings = api.settings
+        old = settings.use_filesystem_cache, settings.cache_directory
+        settings.use_filesystem_cache = True
+        settings.cache_directory = tempfile.mkdtemp()
+        try:
+            parser = api.builtin.Parser(name='_bisect')
+            source = parser._get_source()
+            assert 'def bisect_left' in source
+
+            parser = api.builtin.Parser(name='_bisect')
+            assert parser._get_source() == source
+            assert parser._module is None  # it hasn't been imported
+        finally:
+            shutil.rmtree(settings.cache_directory)
+            settings.use_filesystem_cache, settings.cache_directory = old
+
+    def test_fast_parser_incremental_split(self):
+        """ Only changed parts are split again, the result has to be the same
+        as a full split. """
+        fast_parser = api.builtin.fast_parser
+        src = "import os\ndef a():\n    pass\n\n@deco\ndef b():\n    " \
+              "pass\n\nclass C:\n    x = 1\n"
+        edits = [src.replace('\n\n@', '\n\nx = 3\n@'),
+                 src.replace('\n\n@', '\n\n@'),
+                 src.replace('def b', 'class B:\n    pass\ndef b'),
+                 src.replace('@deco\n', ''),
+                 src.replace('import os\n', ''),
+                 src + 'def d(): pass',
+                 '']
+        for code in edits:
+            parser = fast_parser.FastParser(src)
+            parser.update(code)
+            expected = fast_parser.FastParser(code)._parts
+            assert parser._parts == expected
+        # unchanged parts are reused
+        parser = fast_parser.FastParser(src)
+        last = parser._parts[-1]
+        parser.update(edits[0])
+        assert parser._parts[-1] is last
+
+    def test_fast_parser_reparse_method(self):
+        """ If only a method body changes, the class is not parsed again. """
+        fast_parser = api.builtin.fast_parser
+        src = "import os\nclass A(object):\n    def a(self):\n        x = 1" \
+              "\n\n    def b(self):\n        return self.a\n"
+        parser = fast_parser.FastParser(src)
+        cls = parser.module.subscopes[0]
+        b = cls.subscopes[1]
+        parser.update(src.replace('x = 1', 'xyz = os'))
+        assert parser.module.subscopes[0] is cls
+        assert cls.subscopes[1] is b
+        a = cls.subscopes[0]
+        self.assertEqual(a.statements[0].get_code(), 'xyz=os\n')
+        assert a.start_pos == (3, 4) and a.end_pos == (6, 4)
+        assert a.statements[0] in parser.module.used_names['os']
+        assert 'x' not in parser.module.used_names
+
+        s = src.replace('x = 1', 'self.a')
+        self.complete(s, (4, 14), path='reparse.py')
+        s = src.replace('x = 1', 'self.b')
+        completions = self.complete(s, (4, 14), path='reparse.py')
+        self.assertEqual([c.word for c in completions], ['b'])
+
+    def test_fast_parser_reparse_method_fallback(self):
+        """
+        Edits, that would change the method differently than a full parse,
+        are parsed with the whole part.
+        """
+        fast_parser = api.builtin.fast_parser
+        src = "class A(object):\n    def a(self):\n        return self.a" \
+              "\n\n    def b(self, q):\n        return q\n\n    @property" \
+              "\n    def c(self):\n        return 3\n"
+        edits = [('        return q', '        for i in q: pass'),
+                 ('\n\n    def b', '\n      q = 3\n    def b'),
+                 ('        return self.a', '      z = 3')]
+        for old, new in edits:
+            code = src.replace(old, new)
+            parser = fast_parser.FastParser(src)
+            parser.update(code)
+            expected = fast_parser.FastParser(code)
+            positions = lambda p: [(f.start_pos, f.end_pos, len(f.statements))
+                                   for f in p.module.subscopes[0].subscopes]
+            self.assertEqual(positions(parser), positions(expected))
+
+    def test_position_index(self):
+        fast_parser = api.builtin.fast_parser
+        src = "import os\nif 1:\n    x = 1\nelse:\n    y = (3,\n 4)\n" \
+              "class A(object):\n    def a(self):\n        z = 1\n"
+        parser = fast_parser.FastParser(src)
+        module = parser.parsers[0].module
+        get = lambda pos, imports=False: \
+            module.get_statement_for_position(pos, imports)
+        name = lambda stmt: str(stmt.get_set_vars()[0])
+        self.assertEqual(name(get((3, 4))), 'x')
+        self.assertEqual(name(get((6, 0))), 'y')
+        assert get((1, 3)) is None
+        assert isinstance(get((1, 3), True), api.parsing.Import)
+        assert get((9, 9)) is parser.module.get_statement_for_position((9, 9))
+        index = module.get_position_index()
+        assert module.get_position_index() is index
+        parser.user_position = 3, 4
+        assert isinstance(parser.scan_user_scope(module), api.parsing.Flow)
+        parser.user_position = 9, 9
+        assert isinstance(parser.scan_user_scope(module), api.parsing.Function)
+
+        # the positions of the index are relative to the line offset
+        parser.update('\n\n' + src)
+        stmt = parser.module.get_statement_for_position((5, 4))
+        self.assertEqual(name(stmt), 'x')
+
+    def test_introspection_in_subprocess(self):
+        settings = api.settings
+        old = settings.introspection_in_subprocess
+        settings.introspection_in_subprocess = True
+        try:
+            parser = api.builtin.Parser(name='_bisect')
+            assert 'def bisect_left' in parser._get_source()
+            assert parser._module is None  # imported by the worker
+
+            # modules that cannot be imported fail like before
+            parser = api.builtin.Parser(name='_not_existing_jedi_module')
+            self.assertRaises(ImportError, parser._get_source)
+        finally:
+            settings.introspection_in_subprocess = old
+
+    def test_deadline(self):
+        s = 'import json\njson.l'
+        deadline = api.Deadline()
+        deadline.cancel()
+        script = api.Script(s, 2, 6, '')
+        assert script.complete(deadline=deadline) == []
+        # the partial results are not cached
+        names = [c.word for c in script.complete(deadline=api.Deadline(10))]
+        self.assertEqual(names, ['load', 'loads'])
+
+    def test_module_cache_limit(self):
+        settings = api.settings
+        old = settings.module_cache_memory
+        old_cache = api.builtin.CachedModule.cache
+        module_cache = api.cache.ModuleCache(api.builtin._module_evicted)
+        api.builtin.CachedModule.cache = module_cache
+        directory = tempfile.mkdtemp()
+        try:
+            paths = []
+            for i in range(4):
+                paths.append(os.path.join(directory, 'mod%s.py' % i))
+                with open(paths[-1], 'w') as f:
+                    f.write('def f():\n    pass\n')
+
+            api.pin_module(paths[0])
+            for path in paths[:3]:
+                api.modules.Module(path).parser
+            size = module_cache.size
+            assert size > 0
+
+            # only the pinned and the new module fit
+            settings.module_cache_memory = size * 2 / 3. / 1024 / 1024
+            api.modules.Module(paths[3]).parser
+            assert paths[0] in module_cache and paths[3] in module_cache
+            assert paths[1] not in module_cache
+            assert paths[2] not in api.builtin.fast_parser.parser_cache
+
+            info = api.get_cache_info()
+            self.assertEqual(info['modules'], 2)
+            self.assertEqual(info['evictions'], 2)
+            assert info['size'] <= info['limit']
+            api.unpin_module(paths[0])
+        finally:
+            settings.module_cache_memory = old
+            api.builtin.CachedModule.cache = old_cache
+            shutil.rmtree(directory)
+
+    def test_name_index(self):
+        settings = api.settings
+        old = settings.use_filesystem_cache, settings.cache_directory
+        settings.use_filesystem_cache = True
+        settings.cache_directory = tempfile.mkdtemp()
+        directory = tempfile.mkdtemp()
+        try:
+            def write(name, source):
+                path = os.path.join(directory, name)
+                with open(path, 'w') as f:
+                    f.write(source)
+                return path
+
+            a = write('a.py', 'def func(foo):\n    return foo\n')
+            b = write('b.py', 'import a\na.func(1)\n')
+            write('c.txt', 'func')
+            index = api.dynamic.NameIndex()
+            self.assertEqual(sorted(index.get_paths(directory, 'func')),
+                             [a, b])
+            self.assertEqual(index.get_paths(directory, 'fun'), [])
+
+            # changed files are read again
+            write('b.py', 'import a\n')
+            os.utime(b, (0, 0))
+            self.assertEqual(index.get_paths(directory, 'func'), [a])
+            os.remove(a)
+            self.assertEqual(index.get_paths(directory, 'func'), [])
+
+            # the index is stored on disk
+            files = api.cache.module_pickling.load_index(directory)
+            self.assertEqual(list(files.keys()), [b])
+        finally:
+            shutil.rmtree(directory)
+            shutil.rmtree(settings.cache_directory)
+            settings.use_filesystem_cache, settings.cache_directory = old
+
+    def test_index_project(self):
+        directory = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(directory, 'pkg'))
+            sources = {'a.py': 'import os\nclass A():\n'
+                               '    def f(self): pass\n',
+                       'pkg/__init__.py': 'from a import A\nA().f()\n',
+                       'pkg/b.txt': 'A'}
+            for name, source in sources.items():
+                with open(os.path.join(directory, name), 'w') as f:
+                    f.write(source)
+            # files, that cannot be decoded (Python 3), are skipped
+            c = os.path.join(directory, 'pkg', 'c.py')
+            with open(c, 'wb') as f:
+                f.write(b'c = "\xff"\n')
+
+            summaries = api.index_project(directory, workers=2)
+            summaries.pop(c, None)
+            a = os.path.join(directory, 'a.py')
+            init = os.path.join(directory, 'pkg', '__init__.py')
+            self.assertEqual(sorted(summaries.keys()), [a, init])
+            summary = summaries[a]
+            self.assertEqual(summary['imports'], ['import os'])
+            self.assertEqual([n for pos, n in summary['defined_names']],
+                             ['os', 'A'])
+            self.assertEqual([s[:3] for s in summary['scopes']],
+                             [('class', 'A', (2, 0)),
+                              ('function', 'f', (3, 4))])
+            self.assertEqual(summaries[init]['used_names']['f'], [(2, 0)])
+
+            # the names are in the index of the dynamic search now
+            index = api.dynamic.name_index
+            self.assertEqual(index.get_paths(os.path.dirname(init), 'A'),
+                             [init])
+            summaries_1 = api.index_project(directory, 1)
+            summaries_1.pop(c, None)
+            self.assertEqual(summaries, summaries_1)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_import_resolution_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'main.py')
+            src = 'import foo_mod\nfoo_mod.'
+            with open(path, 'w') as f:
+                f.write(src)
+            self.assertEqual(self.complete(src, path=path), [])
+
+            # a new module is found in the next request
+            os.mkdir(os.path.join(directory, 'foo_mod'))
+            with open(os.path.join(directory, 'foo_mod', '__init__.py'),
+                      'w') as f:
+                f.write('bar = 1\n')
+            completions = self.complete(src, path=path)
+            self.assertEqual([c.word for c in completions], ['bar'])
+
+            collector = api.Collector()
+            api.set_profiling_collector(collector)
+            try:
+                self.complete(src, path=path)
+            finally:
+                api.set_profiling_collector(None)
+            self.assertFalse(collector.counters.get('imports.resolved'))
+            self.assertTrue(collector.counters['imports.cached'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_module_names(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for name in ['json_a.py', 'Json_b.so', 'json_c.txt',
+                         '__init__.py']:
+                open(os.path.join(directory, name), 'w').close()
+            os.mkdir(os.path.join(directory, 'json_pkg'))
+            os.mkdir(os.path.join(directory, 'json_dir'))
+            open(os.path.join(directory, 'json_pkg', '__init__.py'),
+                 'w').close()
+            names = api.imports._module_names
+            self.assertEqual(names(directory, 'json'),
+                             ['json_a', 'Json_b', 'json_pkg'])
+            self.assertEqual(names(directory, 'json_p'), ['json_pkg'])
+
+            # new modules are found in the next request
+            open(os.path.join(directory, 'json_d.py'), 'w').close()
+            api.cache.clear_caches()
+            self.assertEqual(names(directory, 'json_')[-2:],
+                             ['json_d', 'json_pkg'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_threads(self):
+        sources = ['import os\nos.path.jo',
+                   'def f(a):\n    return a\nf(1).rea',
+                   'class A():\n    def b(self): pass\nA().b',
+                   'import json\njson.lo',
+                   '[1, ""][0].real.den']
+
+        def complete(src):
+            lines = src.splitlines()
+            script = api.Script(src, len(lines), len(lines[-1]), '')
+            return sorted(c.word for c in script.complete())
+
+        expected = [complete(src) for src in sources]
+        api.cache.clear_caches(delete_all=True)
+        results = {}
+        request_ids = []
+
+        def run(i):
+            for j in range(3):
+                src = sources[(i + j) % len(sources)]
+                results[i, j] = complete(src)
+                request_ids.append(api.common.request.id)
+
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(len(sources))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for (i, j), words in results.items():
+            self.assertEqual(words, expected[(i + j) % len(sources)])
+        self.assertEqual(len(results), len(sources) * 3)
+        # the requests have ended
+        self.assertFalse(set(request_ids) & api.common.active_requests)
+
+    def test_async_evaluate(self):
+        # the evaluation in the executor threads works without asyncio
+        key = ('complete', 'import json\njson.lo', 2, 7, 'buffer.py', ())
+        results = []
+
+        def run():
+            results.append(async_api._evaluate(key, api.Deadline()))
+
+        threads = [threading.Thread(target=run) for i in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([[c.word for c in r] for r in results],
+                         [['load', 'loads']] * 3)
+
+        key = ('get_in_function_call', 'abs(', 1, 4, 'buffer.py', ())
+        call_def = async_api._evaluate(key, api.Deadline())
+        self.assertEqual(call_def.call_name, 'abs')
+
+    def test_async_evaluator(self):
+        if async_api.asyncio is None:
+            return
+        asyncio = async_api.asyncio
+        loop = asyncio.new_event_loop()
+        evaluator = async_api.AsyncEvaluator(loop=loop)
+        try:
+            src = 'import json\njson.lo'
+            # the first request is cancelled by the newer one of the buffer
+            old = evaluator.complete('import os\nos.', 2, 3, 'buffer.py')
+            first = evaluator.complete(src, 2, 7, 'buffer.py')
+            second = evaluator.complete(src, 2, 7, 'buffer.py')
+            results = loop.run_until_complete(asyncio.gather(old, first,
+                                        second, return_exceptions=True))
+        finally:
+            loop.close()
+        self.assertTrue(isinstance(results[0], asyncio.CancelledError))
+        self.assertEqual([c.word for c in results[1]], ['load', 'loads'])
+        # equal requests share the evaluation
+        self.assertTrue(results[1] is results[2])
+        self.assertEqual(evaluator._running, {})
+
+        # a cancelled request isn't shared with a later equal request
+        loop = asyncio.new_event_loop()
+        evaluator = async_api.AsyncEvaluator(loop=loop)
+        try:
+            requests = [evaluator.complete(src, 2, column, 'buffer.py')
+                        for column in (6, 7, 6)]
+            results = loop.run_until_complete(asyncio.gather(*requests,
+                                                    return_exceptions=True))
+        finally:
+            loop.close()
+        self.assertTrue(isinstance(results[0], asyncio.CancelledError))
+        self.assertTrue(isinstance(results[1], asyncio.CancelledError))
+        self.assertEqual([c.word for c in results[2]], ['load', 'loads'])
+
+    def test_compact_parser_objects(self):
+        parser = api.parsing.PyFuzzyParser('foo = bar\nfoo.baz((1), (2))\n')
+        stmts = parser.module.statements
+        self.assertFalse(hasattr(stmts[0], '__dict__'))
+        self.assertFalse(hasattr(stmts[0].get_set_vars()[0], '__dict__'))
+        attributes = dict(api.parsing.get_attributes(stmts[0]))
+        self.assertEqual(attributes['code'], 'foo=bar')
+        # equal names share one string
+        tokens = [t[1] for t in stmts[1].token_list if isinstance(t, tuple)]
+        brackets = [t for t in tokens if t == '(']
+        self.assertEqual(len(brackets), 3)
+        self.assertTrue(brackets[1] is brackets[2])
+
+        copied = api.helpers.fast_parent_copy(stmts[1])
+        self.assertEqual(copied.get_code(), stmts[1].get_code())
+        self.assertTrue(copied.used_funcs[0].parent is copied)
+
+    def test_lazy_function_bodies(self):
+        directory = tempfile.mkdtemp()
+        api.settings.lazy_function_bodies = True
+        try:
+            os.mkdir(os.path.join(directory, 'big_pkg'))
+            with open(os.path.join(directory, 'big_pkg', '__init__.py'),
+                      'w') as f:
+                f.write('x = 1\n\n'
+                        'def f():\n    """doc"""\n    return ""\n\n'
+                        'class C(object):\n'
+                        '    def m(self):\n        return self.n\n')
+            path = os.path.join(directory, 'main.py')
+
+            words = [c.word for c in
+                     self.complete('from big_pkg import x\nx.re', path=path)]
+            self.assertEqual(words, ['real'])
+            init = os.path.join(directory, 'big_pkg', '__init__.py')
+            module = api.builtin.CachedModule.cache[init][1].module
+            f = module.subscopes[0]
+            m = module.subscopes[1].subscopes[0]
+            self.assertTrue('_lazy_body' in f.__dict__)
+            self.assertTrue('_lazy_body' in m.__dict__)
+
+            words = [c.word for c in
+                     self.complete('from big_pkg import f\nf().low',
+                                   path=path)]
+            self.assertEqual(words, ['lower'])
+            self.assertFalse('_lazy_body' in f.__dict__)
+            self.assertTrue('_lazy_body' in m.__dict__)
+            script = api.Script('from big_pkg import f\nf', 2, 1, path)
+            self.assertEqual(script.get_definition()[0].doc, 'f()\n\ndoc')
+            # only the bodies, that contain a name, are parsed for it
+            self.assertFalse('y' in module.used_names)
+            self.assertTrue('_lazy_body' in m.__dict__)
+            self.assertEqual(sorted(s.start_pos
+                                    for s in module.used_names['self']),
+                             [(8, 10), (9, 15)])
+            self.assertFalse('_lazy_body' in m.__dict__)
+        finally:
+            api.settings.lazy_function_bodies = False
+            shutil.rmtree(directory)
+
+    def test_fast_tokenizer(self):
+        def tokens(source, fast, line_offset=0):
+            api.settings.fast_tokenizer = fast
+            try:
+                gen = api.common.NoErrorTokenizer(
+                    api.parsing.StringIO(source).readline, line_offset)
+                result = []
+                try:
+                    while True:
+                        result.append(tuple(next(gen)))
+                except StopIteration:
+                    pass
+                return result
+            finally:
+                api.settings.fast_tokenizer = True
+
+        s = 'def f(a, b=r"x"):\n    """\n doc"""\n    return [a,\n  b] # c\n'
+        self.assertEqual(tokens(s, True, 3), tokens(s, False, 3))
+        # inconsistent dedent, tokenize raises an IndentationError
+        s = 'if 1:\n        a\n    b\nc\n'
+        self.assertEqual([t[1] for t in tokens(s, True) if t[1].strip()],
+                         ['if', '1', ':', 'a', 'b', 'c'])
+        # not closed brackets end the tokens
+        self.assertEqual([t[1] for t in tokens('foo(1,\n', True)],
+                         ['foo', '(', '1', ',', '\n'])
+
+        s = 'def f(a):\n  if a:\n        return 1\n    return 2\n'
+        parser = api.parsing.PyFuzzyParser(s)
+        self.assertEqual(len(parser.module.subscopes[0].returns), 2)
+
+    def test_batch(self):
+        s = 'import os\nclass A():\n    def f(self):\n        return os\n' \
+            'a = A()\na.f().pa\na.f\n('
+        requests = [('complete', 6, 8), ('get_definition', 7, 3),
+                    ('goto', 5, 0), ('get_definition', 3, 7),
+                    ('goto', 1, 8)]
+        results = api.batch(s, requests, 'batch.py')
+        self.assertTrue('path' in [c.word for c in results[0]])
+        self.assertEqual([d.description for d in results[1]], ['def f'])
+        self.assertEqual([d.start_pos for d in results[2]], [(5, 0)])
+        self.assertEqual(results[3], [])
+        self.assertEqual([d.description for d in results[4]], ['module os'])
+
+        script = self.get_script(s, (3, 7), 'batch.py')
+        self.assertRaises(api.NotFoundError, script.get_definition)
+        for (method, line, column), result in zip(requests, results):
+            if result:
+                script = self.get_script(s, (line, column), 'batch.py')
+                self.assertEqual(repr(getattr(script, method)()),
+                                 repr(result))
+        self.assertRaises(ValueError, api.batch, s, [('foo', 1, 0)], '')
+
+        # the methods are checked before the evaluation
+        collector = api.Collector()
+        api.set_profiling_collector(collector)
+        try:
+            self.assertRaises(ValueError, api.batch, s,
+                              requests + [('foo', 1, 0)], 'batch.py')
+        finally:
+            api.set_profiling_collector(None)
+        self.assertEqual(collector.summary(), {})
+
+        # a failing request doesn't stop the others
+        goto = api.evaluate.goto
+
+        def failing_goto(stmt, call_path=None):
+            raise TypeError('evaluation bug')
+
+        api.evaluate.goto = failing_goto
+        try:
+            results = api.batch(s, [('goto', 5, 0), ('complete', 6, 8)],
+                                'batch.py')
+        finally:
+            api.evaluate.goto = goto
+        self.assertEqual(results[0], [])
+        self.assertTrue('path' in [c.word for c in results[1]])
+
+    def test_index_names(self):
+        s = 'import os.path as p\nclass A():\n    def f(self, a):\n' \
+            '        self.b = a\n        return os\nx = A().f(1).path'
+        script = self.get_script(s, (1, 0), 'index_names.py')
+        result = [(name.text, name.start_pos,
+                   [d.description for d in definitions])
+                  for name, definitions in script.index_names()]
+        self.assertEqual([r[:2] for r in result[:3]],
+                         [('os', (1, 7)), ('path', (1, 10)), ('p', (1, 18))])
+        self.assertEqual(result[0][2], ['module os'])
+        self.assertEqual(result[3:], [
+            ('self', (3, 10), ['self']),
+            ('a', (3, 16), ['a']),
+            ('self', (4, 8), ['self']),
+            ('b', (4, 13), ['self.b=a']),
+            ('a', (4, 17), ['a']),
+            ('os', (5, 15), []),
+            ('x', (6, 0), ['x=A().f(1).path']),
+            ('A', (6, 4), ['class A']),
+            ('f', (6, 8), ['def f']),
+            ('path', (6, 13), [])])
+
+        deadline = api.Deadline()
+        deadline.cancel()
+        self.assertEqual(list(script.index_names(deadline)), [])
+
+    def test_index_names_failing_statement(self):
+        goto = api.evaluate.goto
+
+        def failing_goto(stmt, call_path=None):
+            if 'fails' in [str(n) for n in call_path or []]:
+                raise TypeError('evaluation bug')
+            return goto(stmt, call_path)
+
+        s = "x = 1\ny = x.fails\nx\n"
+        script = self.get_script(s, (1, 0), 'index_names_failing.py')
+        api.evaluate.goto = failing_goto
+        try:
+            result = [(name.text, [d.description for d in definitions])
+                      for name, definitions in script.index_names()]
+        finally:
+            api.evaluate.goto = goto
+        # the names of the statement are there, but without definitions
+        self.assertEqual(result, [('x', ['x=1']), ('y', ['y=x.fails']),
+                                  ('x', []), ('fails', []), ('x', ['x=1'])])
+
+    def test_profiling_collector(self):
+        collector = api.Collector()
+        api.set_profiling_collector(collector)
+        try:
+            s = 'def f(a):\n    a\nf(1)\nimport json\njson.l'
+            self.complete(s, path='profiling.py')
+        finally:
+            api.set_profiling_collector(None)
+        summary = collector.summary()
+        for name in ['complete', 'parse', 'import', 'follow_statement']:
+            assert summary[name][0] > 0
+        assert collector.counters['fast_parser.parsed'] > 0
+
+        trace = collector.chrome_trace()
+        names = set(e['name'] for e in trace['traceEvents'])
+        assert 'complete' in names
+        self.assertEqual(trace['otherData'], collector.counters)
+
+        # the profiled functions keep their names and docstrings
+        self.assertEqual(api.dynamic.search_params.__name__, 'search_params')
+        self.assertEqual(api.Script._complete.__name__, '_complete')
+        follow_statement = api.evaluate.follow_statement.func
+        self.assertEqual(follow_statement.__name__, 'follow_statement')
+        assert follow_statement.__doc__.strip().startswith('The starting')
+
+    def test_server(self):
+        import json
+        srv = server.Server()
+        path = os.path.abspath('server_test.py')
+        open_msg = {'jsonrpc': '2.0', 'method': 'didOpen',
+                    'params': {'path': path, 'source': 'import json\njson.lo'}}
+        assert srv.handle(json.dumps(open_msg)) is None
+
+        request = {'jsonrpc': '2.0', 'id': 1, 'method': 'complete',
+                   'params': {'path': path, 'line': 2, 'column': 7}}
+        response = srv.handle(json.dumps(request))
+        self.assertEqual(response['id'], 1)
+        words = [c['word'] for c in response['result']]
+        self.assertEqual(set(words), set(['load', 'loads']))
+
+        request['params']['line'] = 3
+        request['method'] = 'goto'
+        del request['params']['column']
+        response = srv.handle(json.dumps(request))
+        self.assertEqual(response['error']['code'], server.INVALID_PARAMS)
+        response = srv.handle('{"jsonrpc": "2.0", "id": 2, "method": "x"}')
+        self.assertEqual(response['error']['code'], server.METHOD_NOT_FOUND)
+        response = srv.handle('{"jsonrpc": "2.0", "id": 3, "method": 1}')
+        self.assertEqual(response['error']['code'], server.INVALID_REQUEST)
+        response = srv.handle('{"jsonrpc": "2.0", "id": 4, '
+                              '"method": "cacheInfo", "params": [1]}')
+        self.assertEqual(response['error']['code'], server.INVALID_PARAMS)
+
 
 class TestFeature(Base):
     def test_full_name(self):